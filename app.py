@@ -1,101 +1,175 @@
+import hmac
+import json
+import os
+
 import streamlit as st
 import pandas as pd
-import altair as alt
-import plotly.express as px
-import json
-import numpy as np
-import plotly.graph_objects as go
+
+# Altair e Plotly são importados dentro das seções que os usam, para não
+# pesar no início do script nem em reruns que não desenham gráficos
+from painel import aquecimento, dados, figuras, geo, graficos, medicao
+from painel.agregados import Cubo
+from painel.consultas import LIMITE_LINHAS, TABELA, Motor, disponivel as motor_disponivel
+from painel.correlacao import Correlacoes, RegistroPares
+from painel.posicoes import Posicoes
+from painel.series import TRANSFORMACOES, VALOR, SeriesTemporais
+from painel.tabela import Tabela
+from painel.metricas import METRICAS
 
 st.set_page_config(layout="wide", page_title="Painel Socioeconômico do Brasil")
 st.title("Painel Socioeconômico do Brasil")
 st.markdown("Análise de indicadores socioeconômicos por Unidade da Federação (UF) e Ano.")
 
-@st.cache_data
-def load_data():
-    try:
-        df = pd.read_csv(
-            "dados_consolidados_corrigido.csv", # Certifique-se que o nome do arquivo está correto
-            sep=',', # SEU NOVO ARQUIVO USA VÍRGULA, NÃO PONTO E VÍRGULA
-            decimal='.' # Assumindo que os decimais agora usam ponto
-        )
+# Aquecimento em segundo plano (idempotente): com servidor.py ele já começou
+# antes do primeiro acesso; com streamlit run, começa aqui e renova os
+# caches quando a versão dos dados muda (ver painel/aquecimento.py)
+aquecimento.iniciar("dados_consolidados_corrigido.csv", 'brasil_estados.json')
 
-        # --- CORREÇÃO AQUI ---
-        # Usar o nome correto da coluna 'Populacao_total' com P maiúsculo
-        df['Populacao_total'] = pd.to_numeric(df['Populacao_total'], errors='coerce')
-        df = df.dropna(subset=['Populacao_total']) 
-
-        # --- CORREÇÃO AQUI ---
-        pop_100k = df['Populacao_total'] / 100000
-        
-        cols_to_convert = [
-            'num_homicidios', 'num_obitos_suicidio', 'num_internacoes_cardio',
-            'num_mortes_cardio', 'num_obitos_transporte'
-        ]
-        
-        for col in cols_to_convert:
-             # Verificar se a coluna existe antes de tentar converter
-             if col in df.columns:
-                 rate_col_name = f"{col.replace('num_', '')}_por_100k"
-                 # Usar replace para tratar possíveis infinitos antes de dividir
-                 numeric_col = pd.to_numeric(df[col], errors='coerce').replace([np.inf, -np.inf], np.nan)
-                 df[rate_col_name] = (numeric_col / pop_100k).round(2)
-             else:
-                 st.warning(f"Coluna '{col}' não encontrada no CSV para cálculo de taxa.")
+def versao_dados():
+    # Barato (stat do CSV + manifesto): a cada rerun percebe versões novas
+    # publicadas por uma ingestão, sem recarregar a página
+    try:
+        return dados.versao_atual("dados_consolidados_corrigido.csv")
+    except Exception:
+        return None # O erro é mostrado por load_data
+
+# Com copy-on-write, recortes e colunas derivadas do quadro compartilhado
+# nunca o alteram; por isso load_data pode devolver o mesmo objeto a todas
+# as sessões (cache_resource) em vez de uma cópia serializada por sessão
+pd.set_option("mode.copy_on_write", True)
+
+@medicao.em_cache('load_data', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('dados')
+def load_data(versao):
+    try:
+        # O CSV só é lido de novo quando muda; fora isso o quadro já
+        # processado vem do cache colunar em disco (ver painel/dados.py)
+        df = dados.carregar("dados_consolidados_corrigido.csv")
 
+        for col in dados.colunas_ausentes(df):
+            st.warning(f"Coluna '{col}' não encontrada no CSV para cálculo de taxa.")
 
         return df
-    except FileNotFoundError:
+    except FileNotFoundError as e:
+        if os.path.basename(e.filename or '') != "dados_consolidados_corrigido.csv":
+            # Arquivo do cache em disco sumiu (versão podada durante a leitura)
+            st.error(f"Erro ao ler o cache de dados ({e.filename}); recarregue a página.")
+            return pd.DataFrame()
         st.error("Erro: Arquivo 'dados_consolidados_corrigido.csv' não encontrado. Certifique-se de que ele está no mesmo diretório.")
         return pd.DataFrame() 
     except Exception as e: # Captura outros erros de leitura/processamento
         st.error(f"Erro ao carregar ou processar dados: {e}")
         return pd.DataFrame()
 
-df = load_data()
-
-if df.empty:
-    st.stop()
-
-st.sidebar.header("Filtros")
-anos_disponiveis = sorted(df['Ano'].unique(), reverse=True)
-ano_selecionado = st.sidebar.selectbox("Selecione o Ano:", anos_disponiveis)
-
-ufs_disponiveis = sorted(df['UF'].unique())
-uf_selecionada = st.sidebar.selectbox("Selecione a UF (para detalhes):", ["Brasil"] + ufs_disponiveis)
-
-metricas = {
-    'Taxa de Desemprego (%)': 'taxa_desemprego_media',
-    'Renda Média Anual': 'renda_media_anual',
-    'População Total': 'Populacao_total',
-    'Taxa de Escolarização (Fundamental %)': 'perc_esc_fundamental',
-    'Taxa de Escolarização (Médio %)': 'perc_esc_medio',
-    'Homicídios (por 100k hab.)': 'homicidios_por_100k',
-    'Suicídios (por 100k hab.)': 'obitos_suicidio_por_100k',
-    'Internações Cardio (por 100k hab.)': 'internacoes_cardio_por_100k',
-    'Mortes Cardio (por 100k hab.)': 'mortes_cardio_por_100k',
-    'Óbitos Transporte (por 100k hab.)': 'obitos_transporte_por_100k',
-    'Homicídios (Absoluto)': 'num_homicidios',
-    'Homicídios Arma de Fogo (Absoluto)': 'num_homicidios_arma'
-}
+metricas = METRICAS
 lista_nomes_metricas = list(metricas.keys())
 lista_cols_metricas_numericas = list(metricas.values())
 
+@st.cache_resource
+def ultimos_agregados():
+    # Último cubo e correlações montados: base para atualizar só as partições
+    # que uma ingestão alterou, em vez de remontar tudo
+    return {}
+
+@medicao.em_cache('load_motor', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('motor')
+def load_motor(versao, _df):
+    # Base DuckDB em memória por versão (opcional; ver painel/consultas.py)
+    return Motor(_df) if motor_disponivel() else None
+
+@medicao.em_cache('load_cubo', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('cubo')
+def load_cubo(versao, _df, _motor=None):
+    # Um cubo por versão dos dados, compartilhado entre as sessões; com o
+    # motor SQL, as leituras e os agregados nacionais são feitos nele
+    ultimos = ultimos_agregados()
+    anterior = ultimos.get('cubo')
+    cubo = anterior.atualizado(_df, _motor) if anterior is not None else Cubo(_df, motor=_motor)
+    ultimos['cubo'] = cubo
+    return cubo
+
+@medicao.em_cache('load_pares', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('pares')
+def load_pares(versao, _cubo):
+    return RegistroPares(_cubo)
+
+@medicao.em_cache('load_correlacoes', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('correlacoes')
+def load_correlacoes(versao, _cubo):
+    # Pearson e Spearman de todos os pares, para todos os anos, de uma vez
+    ultimos = ultimos_agregados()
+    anterior = ultimos.get('correlacoes')
+    correlacoes = anterior.atualizado(_cubo) if anterior is not None else Correlacoes(_cubo)
+    ultimos['correlacoes'] = correlacoes
+    return correlacoes
+
+@medicao.em_cache('load_posicoes', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('posicoes')
+def load_posicoes(versao, _cubo):
+    # Posições, percentis e variações de todas as UFs, para todos os anos e métricas
+    return Posicoes(_cubo)
+
+@medicao.em_cache('load_series', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('series')
+def load_series(versao, _cubo):
+    # Variação anual, CAGR, média móvel e índice de todas as UFs e do Brasil
+    return SeriesTemporais(_cubo)
+
+@medicao.em_cache('load_tabela', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('tabela')
+def load_tabela(versao, _df):
+    # Ordens de todas as colunas, para ordenar e paginar sem reordenar o quadro
+    return Tabela(_df, ['UF', 'Ano'] + lista_cols_metricas_numericas)
+
+@medicao.em_cache('load_geometria', st.cache_resource(max_entries=2))
+@aquecimento.preaquecido('geometria')
+def load_geometria(caminho, mtime):
+    # Simplificado uma vez por conteúdo do arquivo e por máquina; os outros
+    # processos leem os níveis publicados no cache (ver painel/geo.py)
+    return geo.carregar(caminho)
+
+def cache_figuras():
+    # Especificações das figuras, compartilhadas entre as sessões e preenchidas
+    # também pelo aquecimento (ver painel/figuras.py e painel/aquecimento.py)
+    return aquecimento.cache_figuras()
+
+def mostrar_figura(secao, nome, entradas, construir):
+    # Figura montada uma vez por versão dos dados e entradas da seção;
+    # reruns e sessões com as mesmas entradas só releem a especificação
+    def construir_medido():
+        with medicao.medir(f"{secao}.figura"):
+            return construir()
+
+    chave = (cubo.versao, secao, nome) + tuple(entradas)
+    tipo, figura, tamanho = cache_figuras().obter(chave, construir_medido)
+    medicao.registrar_payload(secao, nome, tamanho)
+    if tipo == figuras.PLOTLY:
+        st.plotly_chart(figura, use_container_width=True)
+    else:
+        st.vega_lite_chart(figura, use_container_width=True)
+
 
-df_filtrado_ano = df[df['Ano'] == ano_selecionado]
 
-st.header(f"Indicadores Nacionais - {ano_selecionado}")
+# Cada seção é um fragmento com entradas explícitas: mexer num widget de uma
+# seção reexecuta e reenvia só aquela seção, não a página inteira.
 
-media_desemprego_br = df_filtrado_ano['taxa_desemprego_media'].mean()
-media_renda_br = df_filtrado_ano['renda_media_anual'].mean()
-total_pop_br = df_filtrado_ano['Populacao_total'].sum()
-media_homicidios_100k_br = df_filtrado_ano['homicidios_por_100k'].mean()
+@st.fragment
+@medicao.fragmento_medido('kpis')
+def secao_kpis(cubo, ano_selecionado):
+    st.header(f"Indicadores Nacionais - {ano_selecionado}")
 
-pop_formatado = f"{total_pop_br:,.0f}".replace(",", ".") if pd.notna(total_pop_br) else "N/D"
-desemprego_formatado = f"{media_desemprego_br:.1f}%" if pd.notna(media_desemprego_br) else "N/D"
-renda_formatado = f"R$ {media_renda_br:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(media_renda_br) else "N/D"
-homicidios_formatado = f"{media_homicidios_100k_br:.1f}" if pd.notna(media_homicidios_100k_br) else "N/D"
+    # Agregados pela regra de cada métrica: médias ponderadas pela população e somas
+    media_desemprego_br = cubo.valor_nacional(ano_selecionado, 'taxa_desemprego_media')
+    media_renda_br = cubo.valor_nacional(ano_selecionado, 'renda_media_anual')
+    total_pop_br = cubo.valor_nacional(ano_selecionado, 'Populacao_total')
+    media_homicidios_100k_br = cubo.valor_nacional(ano_selecionado, 'homicidios_por_100k')
 
-st.markdown(f"""
+    pop_formatado = f"{total_pop_br:,.0f}".replace(",", ".") if pd.notna(total_pop_br) else "N/D"
+    desemprego_formatado = f"{media_desemprego_br:.1f}%" if pd.notna(media_desemprego_br) else "N/D"
+    renda_formatado = f"R$ {media_renda_br:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".") if pd.notna(media_renda_br) else "N/D"
+    homicidios_formatado = f"{media_homicidios_100k_br:.1f}" if pd.notna(media_homicidios_100k_br) else "N/D"
+
+    st.markdown(f"""
 <style>
 .kpi-container {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 1.5rem; margin-bottom: 2rem; }}
 .kpi-card {{ background-color: #FFFFFF; border-radius: 8px; padding: 1.5rem; text-align: center; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1); border-left: 5px solid #007bff; transition: transform 0.2s ease-in-out; }}
@@ -114,420 +188,515 @@ st.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
-st.divider()
 
-st.header(f"Mapa do Brasil - {ano_selecionado}")
-metrica_mapa_nome = st.selectbox("Selecione a Métrica para o Mapa:", lista_nomes_metricas, index=0) 
-metrica_mapa_col = metricas[metrica_mapa_nome]
+@st.fragment
+@medicao.fragmento_medido('mapa')
+def secao_mapa(cubo, ano_selecionado):
+    st.header(f"Mapa do Brasil - {ano_selecionado}")
+    metrica_mapa_nome = st.selectbox("Selecione a Métrica para o Mapa:", lista_nomes_metricas, index=0) 
+    metrica_mapa_col = metricas[metrica_mapa_nome]
 
-try:
-    geojson_path = 'brasil_estados.json' 
-    with open(geojson_path, 'r', encoding='utf-8') as f: 
-        geojson_br = json.load(f)
-except FileNotFoundError:
-    st.error(f"Arquivo '{geojson_path}' não encontrado.")
-    geojson_br = None
-except json.JSONDecodeError:
-    st.error(f"Erro ao decodificar o arquivo '{geojson_path}'.")
-    geojson_br = None
-except Exception as e:
-    st.error(f"Erro inesperado ao carregar GeoJSON: {e}")
-    geojson_br = None
-
-
-if geojson_br and metrica_mapa_col in df_filtrado_ano.columns:
-    
-    uf_to_sigla_map = {
-        'Acre': 'AC', 'Alagoas': 'AL', 'Amapá': 'AP', 'Amazonas': 'AM',
-        'Bahia': 'BA', 'Ceará': 'CE', 'Distrito Federal': 'DF', 'Espírito Santo': 'ES',
-        'Goiás': 'GO', 'Maranhão': 'MA', 'Mato Grosso': 'MT', 'Mato Grosso do Sul': 'MS',
-        'Minas Gerais': 'MG', 'Pará': 'PA', 'Paraíba': 'PB', 'Paraná': 'PR',
-        'Pernambuco': 'PE', 'Piauí': 'PI', 'Rio de Janeiro': 'RJ', 'Rio Grande do Norte': 'RN',
-        'Rio Grande do Sul': 'RS', 'Rondônia': 'RO', 'Roraima': 'RR', 'Santa Catarina': 'SC',
-        'São Paulo': 'SP', 'Sergipe': 'SE', 'Tocantins': 'TO'
-    }
-    
-    df_mapa = df_filtrado_ano.copy()
-    df_mapa['UF_Sigla'] = df_mapa['UF'].map(uf_to_sigla_map)
-    
-    ufs_nao_mapeadas = df_mapa[df_mapa['UF_Sigla'].isna()]['UF'].unique()
-    if len(ufs_nao_mapeadas) > 0:
-        st.warning(f"UFs não mapeadas: {', '.join(ufs_nao_mapeadas)}.")
-        df_mapa = df_mapa.dropna(subset=['UF_Sigla'])
-
-    df_mapa[metrica_mapa_col] = pd.to_numeric(df_mapa[metrica_mapa_col], errors='coerce')
-    df_mapa = df_mapa.dropna(subset=[metrica_mapa_col])
-
-    if not df_mapa.empty:
-        try:
-            fig_map = px.choropleth_mapbox(df_mapa,
-                                       geojson=geojson_br,
-                                       locations='UF_Sigla', 
-                                       featureidkey="id", 
-                                       color=metrica_mapa_col,
-                                       color_continuous_scale="Blues", 
-                                       mapbox_style="carto-darkmatter", 
-                                       zoom=3, center = {"lat": -14.2350, "lon": -51.9253},
-                                       opacity=0.7,
-                                       hover_name='UF', 
-                                       hover_data={'UF_Sigla': False, metrica_mapa_col: ':.2f'}, 
-                                       title=f"{metrica_mapa_nome} por UF em {ano_selecionado}",
-                                       labels={metrica_mapa_col: metrica_mapa_nome.split('(')[0].strip()}
-                                      )
-            fig_map.update_layout(
-                margin={"r":0,"t":40,"l":0,"b":0},
-                coloraxis_colorbar=dict(
-                    title=dict(
-                        text=metrica_mapa_nome.split('(')[0].strip(), 
-                        font=dict(color='white') 
-                    ),
-                    tickfont=dict(color='white') 
-                )
-             )
-            st.plotly_chart(fig_map, use_container_width=True)
-            
-        except Exception as map_error:
-            st.error(f"Erro ao gerar o mapa: {map_error}")
+    try:
+        geojson_path = 'brasil_estados.json' 
+        mtime_geojson = os.path.getmtime(geojson_path)
+        geometria = load_geometria(geojson_path, mtime_geojson)
+        # Nível simplificado e quantizado: basta para o zoom do mapa e reduz o payload
+        geojson_br = geometria.nivel(geo.NIVEL_MAPA)
+    except FileNotFoundError:
+        st.error(f"Arquivo '{geojson_path}' não encontrado.")
+        geojson_br = None
+    except json.JSONDecodeError:
+        st.error(f"Erro ao decodificar o arquivo '{geojson_path}'.")
+        geojson_br = None
+    except Exception as e:
+        st.error(f"Erro inesperado ao carregar GeoJSON: {e}")
+        geojson_br = None
 
-    else:
-        st.warning(f"Não há dados válidos para '{metrica_mapa_nome}' em {ano_selecionado} para o mapa.")
-
-elif not geojson_br:
-    st.warning("Não é possível exibir o mapa sem o arquivo GeoJSON.")
-else:
-    st.warning(f"Métrica '{metrica_mapa_nome}' não encontrada para o mapa.")
-
-st.divider()
-
-st.header(f"Ranking dos Estados - {ano_selecionado}")
-metrica_ranking_nome = st.selectbox("Selecione a Métrica para o Ranking:", lista_nomes_metricas, index=0)
-metrica_ranking_col = metricas[metrica_ranking_nome]
-
-if metrica_ranking_col in df_filtrado_ano.columns:
-    df_ranking = df_filtrado_ano[['UF', metrica_ranking_col]].copy()
-    df_ranking[metrica_ranking_col] = pd.to_numeric(df_ranking[metrica_ranking_col], errors='coerce')
-    df_ranking = df_ranking.dropna(subset=[metrica_ranking_col])
-
-    if not df_ranking.empty:
-        col_rank1, col_rank2 = st.columns(2)
-        
-        with col_rank1:
-            st.subheader("Maiores Valores")
-            top_chart = alt.Chart(df_ranking.nlargest(10, metrica_ranking_col)).mark_bar().encode(
-                y=alt.Y('UF:N', sort='-x', title="UF"),
-                x=alt.X(f'{metrica_ranking_col}:Q', title=metrica_ranking_nome),
-                tooltip=['UF', alt.Tooltip(f'{metrica_ranking_col}:Q', format=".2f")]
-            ).properties(height=300)
-            st.altair_chart(top_chart, use_container_width=True)
-            
-        with col_rank2:
-            st.subheader("Menores Valores")
-            bottom_chart = alt.Chart(df_ranking.nsmallest(10, metrica_ranking_col)).mark_bar(color='#5276A7').encode(
-                y=alt.Y('UF:N', sort='x', title="UF"),
-                x=alt.X(f'{metrica_ranking_col}:Q', title=metrica_ranking_nome),
-                tooltip=['UF', alt.Tooltip(f'{metrica_ranking_col}:Q', format=".2f")]
-            ).properties(height=300)
-            st.altair_chart(bottom_chart, use_container_width=True)
-    else:
-        st.warning(f"Não há dados válidos para '{metrica_ranking_nome}' em {ano_selecionado} para o ranking.")
-else:
-     st.warning(f"Métrica '{metrica_ranking_nome}' não encontrada para o ranking.")
 
-st.divider()
+    if geojson_br and metrica_mapa_col in cubo.colunas:
 
-st.header(f"Evolução do Estado: {uf_selecionada}")
+        df_mapa = graficos.dados_mapa(cubo, ano_selecionado, metrica_mapa_col)
 
-if uf_selecionada != "Brasil":
-    df_estado = df[df['UF'] == uf_selecionada].sort_values('Ano')
-    
-    metricas_evolucao_nomes = st.multiselect(
-        "Selecione as Métricas para Evolução:",
-        lista_nomes_metricas,
-        default=lista_nomes_metricas[:2] 
-    )
-    
-    if metricas_evolucao_nomes:
-        metricas_evolucao_cols = [metricas[nome] for nome in metricas_evolucao_nomes]
-        
-        df_estado_melted = df_estado.melt(
-            id_vars=['Ano'], 
-            value_vars=metricas_evolucao_cols, 
-            var_name='Métrica', 
-            value_name='Valor'
-        )
-        mapa_nomes_metricas_rev = {v: k for k, v in metricas.items()}
-        df_estado_melted['Métrica'] = df_estado_melted['Métrica'].map(mapa_nomes_metricas_rev)
-        df_estado_melted['Valor'] = pd.to_numeric(df_estado_melted['Valor'], errors='coerce')
-        
-        line_chart = alt.Chart(df_estado_melted).mark_line(point=True).encode(
-            x=alt.X('Ano:O', title='Ano'), 
-            y=alt.Y('Valor:Q', title='Valor', scale=alt.Scale(zero=False)), 
-            color='Métrica:N',
-            tooltip=['Ano', 'Métrica', alt.Tooltip('Valor:Q', format=".2f")]
-        ).properties(
-            title=f"Evolução de Indicadores para {uf_selecionada}"
-        ).interactive()
-        
-        st.altair_chart(line_chart, use_container_width=True)
+        ufs_nao_mapeadas = df_mapa[df_mapa['UF_Sigla'].isna()]['UF'].unique()
+        if len(ufs_nao_mapeadas) > 0:
+            st.warning(f"UFs não mapeadas: {', '.join(ufs_nao_mapeadas)}.")
+            df_mapa = df_mapa.dropna(subset=['UF_Sigla'])
+
+        if not df_mapa.empty:
+            try:
+                def figura_mapa():
+                    return graficos.mapa(df_mapa, geojson_br, metrica_mapa_col, metrica_mapa_nome, ano_selecionado)
+
+                mostrar_figura('mapa', 'choropleth', (ano_selecionado, metrica_mapa_col, mtime_geojson), figura_mapa)
+
+            except Exception as map_error:
+                st.error(f"Erro ao gerar o mapa: {map_error}")
+
+        else:
+            st.warning(f"Não há dados válidos para '{metrica_mapa_nome}' em {ano_selecionado} para o mapa.")
+
+    elif not geojson_br:
+        st.warning("Não é possível exibir o mapa sem o arquivo GeoJSON.")
     else:
-        st.warning("Selecione pelo menos uma métrica para visualizar a evolução.")
-else:
-    df_brasil_evol = df.groupby('Ano').agg(
-        taxa_desemprego_media=('taxa_desemprego_media', 'mean'),
-        renda_media_anual=('renda_media_anual', 'mean'),
-        homicidios_por_100k=('homicidios_por_100k', 'mean'),
-        populacao_total=('Populacao_total', 'sum')
-    ).reset_index()
-
-    metricas_br_evol_nomes = st.multiselect(
-        "Selecione as Métricas Nacionais para Evolução:",
-        ['Taxa de Desemprego (%)', 'Renda Média Anual', 'Homicídios (por 100k hab.)', 'População Total'],
-        default=['Taxa de Desemprego (%)', 'Renda Média Anual']
-    )
+        st.warning(f"Métrica '{metrica_mapa_nome}' não encontrada para o mapa.")
+
+
+@st.fragment
+@medicao.fragmento_medido('ranking')
+def secao_ranking(cubo, ano_selecionado, uf_selecionada, no_navegador=False):
+    if no_navegador:
+        from painel import interativo
+
+        # Todos os anos embutidos no gráfico; ano e métrica trocados no navegador
+        st.header("Ranking dos Estados")
+        mostrar_figura('ranking', 'navegador', (ano_selecionado,),
+                       lambda: interativo.ranking(cubo.quadro(), cubo.anos, ano_selecionado,
+                                                  cubo.colunas[0], cubo.colunas))
+        return
+
+    st.header(f"Ranking dos Estados - {ano_selecionado}")
+    metrica_ranking_nome = st.selectbox("Selecione a Métrica para o Ranking:", lista_nomes_metricas, index=0)
+    metrica_ranking_col = metricas[metrica_ranking_nome]
+
+    if metrica_ranking_col in cubo.colunas:
+        # Série já ordenada do maior para o menor valor (sem ausentes)
+        serie_ranking = cubo.ranking(ano_selecionado, metrica_ranking_col)
+
+        if not serie_ranking.empty:
+            col_rank1, col_rank2 = st.columns(2)
+
+            with col_rank1:
+                st.subheader("Maiores Valores")
+                def figura_maiores():
+                    return graficos.ranking(serie_ranking, metrica_ranking_col, metrica_ranking_nome)
+
+                mostrar_figura('ranking', 'maiores', (ano_selecionado, metrica_ranking_col), figura_maiores)
+
+            with col_rank2:
+                st.subheader("Menores Valores")
+                def figura_menores():
+                    return graficos.ranking(serie_ranking, metrica_ranking_col, metrica_ranking_nome, maiores=False)
+
+                mostrar_figura('ranking', 'menores', (ano_selecionado, metrica_ranking_col), figura_menores)
+
+            # Variações e trajetórias vêm do índice de posições, sem ordenar nada aqui
+            posicoes = load_posicoes(cubo.versao, cubo)
+            ano_anterior = posicoes.ano_anterior(ano_selecionado)
+            if ano_anterior is not None:
+                st.subheader(f"Maiores Variações de Posição ({ano_anterior} → {ano_selecionado})")
+                subiram, cairam = posicoes.maiores_variacoes(ano_selecionado, metrica_ranking_col)
+                col_var1, col_var2 = st.columns(2)
+                for coluna, titulo, tabela in ((col_var1, "Subiram", subiram), (col_var2, "Caíram", cairam)):
+                    with coluna:
+                        st.markdown(f"**{titulo}**")
+                        if tabela.empty:
+                            st.caption("Nenhuma UF.")
+                        else:
+                            st.dataframe(tabela, hide_index=True, use_container_width=True)
+
+            st.subheader("Trajetória de Posição")
+            uf_trajetoria = st.selectbox(
+                "UF para a trajetória:", posicoes.ufs,
+                index=posicoes.ufs.index(uf_selecionada) if uf_selecionada in posicoes.ufs else 0
+            )
 
-    if metricas_br_evol_nomes:
-        mapa_br = {
-            'Taxa de Desemprego (%)': 'taxa_desemprego_media',
-            'Renda Média Anual': 'renda_media_anual',
-            'Homicídios (por 100k hab.)': 'homicidios_por_100k',
-            'População Total': 'populacao_total'
-        }
-        metricas_br_evol_cols = [mapa_br[nome] for nome in metricas_br_evol_nomes]
-
-        df_br_melted = df_brasil_evol.melt(
-            id_vars=['Ano'],
-            value_vars=metricas_br_evol_cols,
-            var_name='Métrica',
-            value_name='Valor'
-        )
-        mapa_nomes_metricas_rev_br = {v: k for k, v in mapa_br.items()}
-        df_br_melted['Métrica'] = df_br_melted['Métrica'].map(mapa_nomes_metricas_rev_br)
-        df_br_melted['Valor'] = pd.to_numeric(df_br_melted['Valor'], errors='coerce')
-
-        line_chart_br = alt.Chart(df_br_melted).mark_line(point=True).encode(
-            x=alt.X('Ano:O', title='Ano'),
-            y=alt.Y('Valor:Q', title='Valor', scale=alt.Scale(zero=False)),
-            color='Métrica:N',
-            tooltip=['Ano', 'Métrica', alt.Tooltip('Valor:Q', format=".2f")]
-        ).properties(
-            title="Evolução de Indicadores Nacionais (Médias/Somas)"
-        ).interactive()
-        st.altair_chart(line_chart_br, use_container_width=True)
+            def figura_trajetoria():
+                return graficos.trajetoria_posicao(posicoes.trajetoria(uf_trajetoria, metrica_ranking_col),
+                                                   uf_trajetoria, metrica_ranking_nome)
+
+            mostrar_figura('ranking', 'trajetoria', (uf_trajetoria, metrica_ranking_col), figura_trajetoria)
+        else:
+            st.warning(f"Não há dados válidos para '{metrica_ranking_nome}' em {ano_selecionado} para o ranking.")
     else:
-        st.warning("Selecione pelo menos uma métrica para visualizar a evolução.")
+         st.warning(f"Métrica '{metrica_ranking_nome}' não encontrada para o ranking.")
 
-st.divider()
 
-st.header("Comparativo de Indicadores por UF")
-st.markdown(f"Compare diferentes métricas lado a lado para os estados no ano de **{ano_selecionado}**.")
+@st.fragment
+@medicao.fragmento_medido('evolucao')
+def secao_evolucao(cubo, uf_selecionada, no_navegador=False):
+    if no_navegador:
+        from painel import interativo
 
+        # Séries de todas as UFs embutidas no gráfico; UF e métrica trocadas no navegador
+        st.header("Evolução dos Estados")
+        mostrar_figura('evolucao', 'navegador', (uf_selecionada,),
+                       lambda: interativo.evolucao(cubo.quadro(), cubo.nacional, uf_selecionada,
+                                                   cubo.colunas[0], cubo.colunas))
+        return
 
-metricas_comp_nomes = st.multiselect(
-    "Selecione 2 ou 3 Métricas para Comparação:",
-    lista_nomes_metricas,
-    default=lista_nomes_metricas[:3], 
-    max_selections=3 
-)
+    st.header(f"Evolução do Estado: {uf_selecionada}")
 
-if len(metricas_comp_nomes) >= 2:
-    metricas_comp_cols = [metricas[nome] for nome in metricas_comp_nomes]
-    
+    # As séries derivadas já vêm prontas; escolher a transformação não recalcula nada
+    series = load_series(cubo.versao, cubo)
+    transformacao = st.radio(
+        "Mostrar:", list(TRANSFORMACOES), format_func=TRANSFORMACOES.get, horizontal=True
+    )
+    sufixo = "" if transformacao == VALOR else f" - {TRANSFORMACOES[transformacao]}"
 
-    col_ordem1, col_ordem2 = st.columns(2)
-    with col_ordem1:
-        metrica_ordem_nome = st.selectbox(
-            "Ordenar UFs por qual métrica?",
-            metricas_comp_nomes,
-            index=0
-        )
-    with col_ordem2:
-        tipo_ranking = st.radio(
-            "Mostrar Ranking:",
-            ("Top 10 (Maiores)", "Bottom 10 (Menores)"),
-            horizontal=True
+    if uf_selecionada != "Brasil":
+        metricas_evolucao_nomes = st.multiselect(
+            "Selecione as Métricas para Evolução:",
+            lista_nomes_metricas,
+            default=lista_nomes_metricas[:2] 
         )
-        
-    metrica_ordem_col = metricas[metrica_ordem_nome]
 
+        if metricas_evolucao_nomes:
+            metricas_evolucao_cols = [metricas[nome] for nome in metricas_evolucao_nomes]
 
-    df_comp = df_filtrado_ano[['UF'] + metricas_comp_cols].copy()
-    
+            def figura_uf():
+                return graficos.evolucao(series.serie(uf_selecionada, metricas_evolucao_cols, transformacao),
+                                         metricas_evolucao_cols, f"Evolução de Indicadores para {uf_selecionada}{sufixo}",
+                                         eixo=TRANSFORMACOES[transformacao])
 
-    for col in metricas_comp_cols:
-        df_comp[col] = pd.to_numeric(df_comp[col], errors='coerce')
-    df_comp = df_comp.dropna(subset=[metrica_ordem_col])
+            mostrar_figura('evolucao', 'uf', (uf_selecionada, tuple(metricas_evolucao_cols), transformacao), figura_uf)
+        else:
+            st.warning("Selecione pelo menos uma métrica para visualizar a evolução.")
+    else:
+        metricas_br_evol_nomes = st.multiselect(
+            "Selecione as Métricas Nacionais para Evolução:",
+            lista_nomes_metricas,
+            default=['Taxa de Desemprego (%)', 'Renda Média Anual']
+        )
 
-    if not df_comp.empty:
+        if metricas_br_evol_nomes:
+            metricas_br_evol_cols = [metricas[nome] for nome in metricas_br_evol_nomes]
 
-        if "Top 10" in tipo_ranking:
-            df_plot = df_comp.nlargest(10, metrica_ordem_col)
+            def figura_brasil():
+                return graficos.evolucao(series.serie("Brasil", metricas_br_evol_cols, transformacao),
+                                         metricas_br_evol_cols,
+                                         f"Evolução de Indicadores Nacionais (Médias Ponderadas pela População/Somas){sufixo}",
+                                         eixo=TRANSFORMACOES[transformacao])
 
-            sort_order = alt.SortField(field=metrica_ordem_col, order='descending') 
+            mostrar_figura('evolucao', 'brasil', (tuple(metricas_br_evol_cols), transformacao), figura_brasil)
         else:
-            df_plot = df_comp.nsmallest(10, metrica_ordem_col)
+            st.warning("Selecione pelo menos uma métrica para visualizar a evolução.")
 
-            sort_order = alt.SortField(field=metrica_ordem_col, order='ascending')
 
+@st.fragment
+@medicao.fragmento_medido('comparativo')
+def secao_comparativo(cubo, ano_selecionado):
+    st.header("Comparativo de Indicadores por UF")
+    st.markdown(f"Compare diferentes métricas lado a lado para os estados no ano de **{ano_selecionado}**.")
 
-        df_plot_melted = df_plot.melt(
-            id_vars='UF', 
-            value_vars=metricas_comp_cols, 
-            var_name='Métrica Código', 
-            value_name='Valor'
-        )
-        
 
-        mapa_nomes_metricas_rev = {v: k for k, v in metricas.items()}
-        df_plot_melted['Métrica'] = df_plot_melted['Métrica Código'].map(mapa_nomes_metricas_rev)
+    metricas_comp_nomes = st.multiselect(
+        "Selecione 2 ou 3 Métricas para Comparação:",
+        lista_nomes_metricas,
+        default=lista_nomes_metricas[:3], 
+        max_selections=3 
+    )
 
+    if len(metricas_comp_nomes) >= 2:
+        metricas_comp_cols = [metricas[nome] for nome in metricas_comp_nomes]
 
-        st.subheader(f"{tipo_ranking} UFs por '{metrica_ordem_nome}'")
-        
 
-        df_plot_melted_px = df_plot_melted.copy()
-        
+        col_ordem1, col_ordem2 = st.columns(2)
+        with col_ordem1:
+            metrica_ordem_nome = st.selectbox(
+                "Ordenar UFs por qual métrica?",
+                metricas_comp_nomes,
+                index=0
+            )
+        with col_ordem2:
+            tipo_ranking = st.radio(
+                "Mostrar Ranking:",
+                ("Top 10 (Maiores)", "Bottom 10 (Menores)"),
+                horizontal=True
+            )
+
+        metrica_ordem_col = metricas[metrica_ordem_nome]
 
-        uf_order = df_plot['UF'].tolist()
 
-        fig_comp = px.bar(
-            df_plot_melted_px,
-            x='UF', 
-            y='Valor',
-            color='Métrica', 
-            barmode='group', 
-            title=f"Comparativo: {', '.join(metricas_comp_nomes)}",
-            labels={'Valor': 'Valor do Indicador', 'Métrica': 'Indicador'},
-            category_orders={'UF': uf_order} 
-        )
-        
-        fig_comp.update_layout(
-            xaxis_title="Unidade da Federação",
-            yaxis_title="Valor",
-            legend_title="Métricas",
-            title_font_size=20,
-            xaxis_tickangle=-45 
-        )
-        st.plotly_chart(fig_comp, use_container_width=True)
-        
-    else:
-        st.warning(f"Não há dados suficientes ou válidos para a métrica '{metrica_ordem_nome}' em {ano_selecionado} para gerar o gráfico.")
+        # A ordem das UFs vem do ranking pré-calculado da métrica de ordenação
+        serie_ordem = cubo.ranking(ano_selecionado, metrica_ordem_col)
 
-else:
-    st.warning("Selecione pelo menos duas métricas para comparação.")
+        if not serie_ordem.empty:
+            if "Top 10" in tipo_ranking:
+                ufs_plot = serie_ordem.index[:10]
+            else:
+                ufs_plot = serie_ordem.index[::-1][:10]
 
+            st.subheader(f"{tipo_ranking} UFs por '{metrica_ordem_nome}'")
 
-st.divider()
+            def figura_comparativo():
+                return graficos.comparativo(cubo.ano(ano_selecionado), ufs_plot, metricas_comp_cols)
 
-if st.checkbox("Mostrar Tabela de Dados Completa"):
-    st.header("Tabela de Dados Anual Consolidada")
-    colunas_display = ['UF', 'Ano', 'populacao_total', 'taxa_desemprego_media', 'renda_media_anual', 'perc_esc_fundamental', 'perc_esc_medio', 'homicidios_por_100k', 'obitos_suicidio_por_100k'] 
-    st.dataframe(df[colunas_display + [col for col in df.columns if '_por_100k' in col and col not in colunas_display]].sort_values(by=['UF', 'Ano']))
+            mostrar_figura('comparativo', 'barras',
+                           (ano_selecionado, tuple(metricas_comp_cols), metrica_ordem_col, tipo_ranking),
+                           figura_comparativo)
 
-st.divider()
+        else:
+            st.warning(f"Não há dados suficientes ou válidos para a métrica '{metrica_ordem_nome}' em {ano_selecionado} para gerar o gráfico.")
 
-st.header("Comparativo Bivariado por UF")
-st.markdown(f"""
+    else:
+        st.warning("Selecione pelo menos duas métricas para comparação.")
+
+
+@st.fragment
+@medicao.fragmento_medido('tabela')
+def secao_tabela(df):
+    if st.checkbox("Mostrar Tabela de Dados Completa"):
+        st.header("Tabela de Dados Anual Consolidada")
+        # Filtros e ordenação são feitos no servidor sobre ordens pré-calculadas;
+        # só a página visível é enviada ao navegador
+        tabela = load_tabela(df.attrs.get('versao'), df)
+
+        col_ufs, col_anos, col_metrica = st.columns(3)
+        ufs_tabela = col_ufs.multiselect("UFs (vazio = todas):", tabela.ufs)
+        anos_tabela = col_anos.slider("Anos:", *tabela.anos, value=tabela.anos) \
+            if tabela.anos[0] < tabela.anos[1] else tabela.anos
+        nomes_tabela = [nome for nome, col in metricas.items() if col in tabela.colunas]
+        metrica_filtro = col_metrica.selectbox("Filtrar por valor de:", ["(nenhuma)"] + nomes_tabela)
+        limites = {}
+        if metrica_filtro != "(nenhuma)":
+            col_filtro = metricas[metrica_filtro]
+            minimo, maximo = tabela.faixa(col_filtro)
+            if minimo < maximo:
+                limites[col_filtro] = col_metrica.slider(f"Faixa de {metrica_filtro}:", minimo, maximo,
+                                                         (minimo, maximo))
+
+        ordenacoes = {"UF e Ano": None, "UF": 'UF', "Ano": 'Ano',
+                      **{nome: metricas[nome] for nome in nomes_tabela}}
+        col_ordem, col_sentido, col_tamanho = st.columns(3)
+        ordenar_por = col_ordem.selectbox("Ordenar por:", list(ordenacoes))
+        crescente = col_sentido.radio("Sentido:", ("Crescente", "Decrescente"), horizontal=True) == "Crescente"
+        tamanho = col_tamanho.selectbox("Linhas por página:", (25, 50, 100, 250))
+
+        linhas = tabela.linhas(tabela.filtrar(ufs_tabela, anos_tabela, limites), ordenacoes[ordenar_por], crescente)
+        total = len(linhas)
+        paginas = max(1, -(-total // tamanho))
+        pagina = st.number_input(f"Página (de {paginas}):", min_value=1, max_value=paginas, value=1, step=1)
+        inicio = (pagina - 1) * tamanho
+        st.dataframe(tabela.pagina(linhas, pagina, tamanho), hide_index=True, use_container_width=True)
+        st.caption(f"Linhas {min(inicio + 1, total)}–{min(inicio + tamanho, total)} de {total}.")
+
+        # O arquivo só é escrito quando pedido, em blocos, com os filtros e a ordem atuais
+        col_formato, col_gerar = st.columns([1, 3])
+        formato = col_formato.radio("Exportar como:", ("CSV", "Parquet"), horizontal=True)
+        pedido = (tabela.versao, tuple(ufs_tabela), tuple(anos_tabela), tuple(limites.items()),
+                  ordenar_por, crescente, formato)
+        if col_gerar.button(f"Preparar {formato} ({total} linhas)", disabled=total == 0):
+            st.session_state['exportacao_tabela'] = (pedido, tabela.exportar(linhas, formato.lower()))
+        exportacao = st.session_state.get('exportacao_tabela')
+        if exportacao is not None and exportacao[0] == pedido:
+            st.download_button(f"Baixar {formato}", exportacao[1],
+                               file_name=f"dados_consolidados.{formato.lower()}",
+                               mime="text/csv" if formato == "CSV" else "application/vnd.apache.parquet")
+
+
+def matriz_correlacao(correlacoes, ano_selecionado):
+    with st.expander(f"Matriz de Correlação entre Indicadores - {ano_selecionado}"):
+        metodo_corr = st.radio("Método:", ("Pearson", "Spearman"), horizontal=True)
+
+        def figura_matriz():
+            return graficos.matriz_correlacao(correlacoes, ano_selecionado, metodo_corr.lower())
+
+        mostrar_figura('bivariado', 'matriz_correlacao', (ano_selecionado, metodo_corr), figura_matriz)
+
+
+
+@st.fragment
+@medicao.fragmento_medido('bivariado')
+def secao_bivariado(cubo, ano_selecionado, no_navegador=False):
+    st.header("Comparativo Bivariado por UF")
+    st.markdown(f"""
 Compare dois indicadores selecionados entre as UFs para o ano de **{ano_selecionado}**. 
 O primeiro indicador é mostrado como colunas (eixo esquerdo), e o segundo como uma linha (eixo direito). 
 As UFs são ordenadas pelo valor do primeiro indicador (colunas).
 """)
 
-# (O dicionário 'tabelas' continua igual)
-try:
-    tabelas = {
-        'Renda Média vs Mortes Cardio (100k)': df[['UF', 'Ano', 'renda_media_anual', 'mortes_cardio_por_100k']].dropna(),
-        'Renda Média vs Internações Cardio (100k)': df[['UF', 'Ano', 'renda_media_anual', 'internacoes_cardio_por_100k']].dropna(),
-        'Escolaridade Média (%) vs Mortes Cardio (100k)': df[['UF', 'Ano', 'perc_esc_medio', 'mortes_cardio_por_100k']].dropna(),
-        'Escolaridade Média (%) vs Internações Cardio (100k)': df[['UF', 'Ano', 'perc_esc_medio', 'internacoes_cardio_por_100k']].dropna(),
-        'Escolaridade Fundamental (%) vs Mortes Cardio (100k)': df[['UF', 'Ano', 'perc_esc_fundamental', 'mortes_cardio_por_100k']].dropna(),
-        'Escolaridade Fundamental (%) vs Internações Cardio (100k)': df[['UF', 'Ano', 'perc_esc_fundamental', 'internacoes_cardio_por_100k']].dropna(),
-        'Suicídios (100k) vs Mortes Cardio (100k)': df[['UF', 'Ano', 'obitos_suicidio_por_100k', 'mortes_cardio_por_100k']].dropna(),
-        'Suicídios (100k) vs Internações Cardio (100k)': df[['UF', 'Ano', 'obitos_suicidio_por_100k', 'internacoes_cardio_por_100k']].dropna(),
-        'Renda Média vs Homicídios (100k)': df[['UF', 'Ano', 'renda_media_anual', 'homicidios_por_100k']].dropna(),
-        'Renda Média vs Desemprego (%)': df[['UF', 'Ano', 'renda_media_anual', 'taxa_desemprego_media']].dropna(),
-    }
-
-    par_selecionado_nome = st.selectbox(
-        "Selecione o Par de Indicadores para Comparar:",
-        list(tabelas.keys())
-    )
+    # Os pares são montados só quando selecionados; os coeficientes vêm do tensor
+    pares = load_pares(cubo.versao, cubo)
+    correlacoes = load_correlacoes(cubo.versao, cubo)
+    opcao_livre = "Outro par (escolher as métricas)"
 
-    df_par_original = tabelas[par_selecionado_nome]
-
-    # Filtrar pelo ano selecionado na sidebar
-    df_par_ano = df_par_original[df_par_original['Ano'] == ano_selecionado].copy()
-
-    if not df_par_ano.empty:
-        metric_cols = [col for col in df_par_ano.columns if col not in ['UF', 'Ano']]
-        
-        if len(metric_cols) == 2:
-            # A primeira métrica do par será as colunas, a segunda a linha
-            coluna_metrica_col = metric_cols[0] 
-            linha_metrica_col = metric_cols[1]
-            
-            mapa_nomes_metricas_rev = {v: k for k, v in metricas.items()}
-            coluna_metrica_nome = mapa_nomes_metricas_rev.get(coluna_metrica_col, coluna_metrica_col)
-            linha_metrica_nome = mapa_nomes_metricas_rev.get(linha_metrica_col, linha_metrica_col)
-
-            # Ordenar o DataFrame pela métrica das colunas (decrescente) para definir a ordem no eixo X
-            df_par_ano_sorted = df_par_ano.sort_values(by=coluna_metrica_col, ascending=False)
-            uf_order = df_par_ano_sorted['UF'].tolist()
-
-            # Base chart (define o eixo X e a fonte de dados)
-            base = alt.Chart(df_par_ano_sorted).encode(
-                alt.X('UF:N', sort=uf_order, title='UF') # Ordena o eixo X
-            )
+    if no_navegador:
+        from painel import interativo
 
-            # Camada das Colunas (eixo Y esquerdo)
-            bars = base.mark_bar().encode(
-                alt.Y(f'{coluna_metrica_col}:Q', title=coluna_metrica_nome, axis=alt.Axis(grid=True)),
-                tooltip=[
-                    alt.Tooltip('UF:N', title='UF'),
-                    alt.Tooltip(f'{coluna_metrica_col}:Q', format=".2f", title=coluna_metrica_nome)
-                ]
-            )
+        # Ano e par escolhidos nos controles do gráfico, sem rerun
+        col_colunas, col_linha = next(iter(pares.sugeridos.values()), cubo.colunas[:2])
+        mostrar_figura('bivariado', 'navegador', (ano_selecionado, col_colunas, col_linha),
+                       lambda: interativo.bivariado(cubo.quadro(), cubo.anos, ano_selecionado,
+                                                    col_colunas, col_linha, cubo.colunas))
+        st.caption("As correlações de cada ano estão na matriz abaixo.")
+        matriz_correlacao(correlacoes, ano_selecionado)
+        return
 
-            line = base.mark_line(color='orange').encode( # Define a cor da LINHA aqui
-                alt.Y(f'{linha_metrica_col}:Q', title=linha_metrica_nome, axis=alt.Axis(grid=False)), 
-                tooltip=[
-                    alt.Tooltip('UF:N', title='UF'),
-                    alt.Tooltip(f'{linha_metrica_col}:Q', format=".2f", title=linha_metrica_nome)
-                ]
-            )
-            
-            # Camada separada para os PONTOS (com cor diferente)
-            points = base.mark_point(color='red', size=50, filled=True).encode( # Define a cor e tamanho dos PONTOS aqui
-                 alt.Y(f'{linha_metrica_col}:Q'), # Mapeia para o mesmo eixo Y da linha
-                 tooltip=[ # Repete o tooltip para os pontos
-                    alt.Tooltip('UF:N', title='UF'),
-                    alt.Tooltip(f'{linha_metrica_col}:Q', format=".2f", title=linha_metrica_nome)
-                ]
-            )
+    try:
+        par_selecionado_nome = st.selectbox(
+            "Selecione o Par de Indicadores para Comparar:",
+            list(pares.sugeridos.keys()) + [opcao_livre]
+        )
 
-            # Combinar as camadas: barras, linha e pontos
-            dual_axis_chart = alt.layer(bars, line, points).resolve_scale( # Adiciona 'points' à camada
-                y='independent' 
-            ).properties(
-                 title=f"{coluna_metrica_nome} (Colunas) vs. {linha_metrica_nome} (Linha/Pontos) por UF - {ano_selecionado}" # Atualiza título
-            ).interactive()
+        if par_selecionado_nome == opcao_livre:
+            col_par1, col_par2 = st.columns(2)
+            with col_par1:
+                nome_colunas = st.selectbox("Indicador das colunas:", lista_nomes_metricas, index=1)
+            with col_par2:
+                nome_linha = st.selectbox("Indicador da linha:", lista_nomes_metricas, index=0)
+            par_cols = [metricas[nome_colunas], metricas[nome_linha]]
+        else:
+            par_cols = list(pares.sugeridos[par_selecionado_nome])
 
-            st.altair_chart(dual_axis_chart, use_container_width=True)
-            
-            # Calcular e mostrar correlação (ainda útil como referência)
-            correlacao_par = df_par_ano[coluna_metrica_col].corr(df_par_ano[linha_metrica_col])
-            st.caption(f"Correlação de Pearson para {ano_selecionado}: **{correlacao_par:.3f}**")
+        if par_cols[0] == par_cols[1]:
+            st.warning("Selecione dois indicadores diferentes.")
+            return
 
+        # Recorte do ano selecionado na sidebar, só com UFs que têm os dois valores
+        with medicao.medir('bivariado.par'):
+            df_par_ano = pares.par(ano_selecionado, *par_cols)
 
-        else:
-            st.warning("A tabela selecionada não contém exatamente duas colunas de métricas.")
-    else:
-        st.warning(f"Não há dados completos (sem valores ausentes) para o par selecionado no ano {ano_selecionado}.")
+        if not df_par_ano.empty:
+            metric_cols = [col for col in df_par_ano.columns if col not in ['UF', 'Ano']]
+
+            if len(metric_cols) == 2:
+                # A primeira métrica do par será as colunas, a segunda a linha
+                coluna_metrica_col = metric_cols[0] 
+                linha_metrica_col = metric_cols[1]
+
+                def figura_eixo_duplo():
+                    return graficos.bivariado(df_par_ano, coluna_metrica_col, linha_metrica_col, ano_selecionado)
+
+                mostrar_figura('bivariado', 'eixo_duplo', (ano_selecionado, coluna_metrica_col, linha_metrica_col),
+                               figura_eixo_duplo)
 
-except KeyError as e:
-    st.error(f"Erro ao acessar coluna: {e}. Verifique se os nomes das colunas no dicionário 'tabelas' correspondem exatamente aos nomes no DataFrame 'df'.")
-except Exception as e_bivar:
-     st.error(f"Ocorreu um erro inesperado na análise bivariada: {e_bivar}")
+                # Correlação (ainda útil como referência), lida do tensor pré-calculado
+                correlacao_par = correlacoes.coeficiente(ano_selecionado, coluna_metrica_col, linha_metrica_col)
+                correlacao_spearman = correlacoes.coeficiente(ano_selecionado, coluna_metrica_col, linha_metrica_col, 'spearman')
+                st.caption(f"Correlação de Pearson para {ano_selecionado}: **{correlacao_par:.3f}** · Spearman: **{correlacao_spearman:.3f}**")
 
 
-# --- Seção da Tabela Opcional (continua igual) ---
-st.divider()
\ No newline at end of file
+            else:
+                st.warning("A tabela selecionada não contém exatamente duas colunas de métricas.")
+        else:
+            st.warning(f"Não há dados completos (sem valores ausentes) para o par selecionado no ano {ano_selecionado}.")
+
+    except KeyError as e:
+        st.error(f"Erro ao acessar coluna: {e}. Verifique se os nomes das colunas em 'PARES_BIVARIADOS' (painel/metricas.py) correspondem exatamente às métricas do painel.")
+    except Exception as e_bivar:
+         st.error(f"Ocorreu um erro inesperado na análise bivariada: {e_bivar}")
+
+    matriz_correlacao(correlacoes, ano_selecionado)
+
+
+@st.fragment
+@medicao.fragmento_medido('sql')
+def secao_sql(motor):
+    if st.checkbox("Mostrar Consulta SQL"):
+        st.header("Consulta SQL (somente leitura)")
+        st.caption(f"Uma instrução SELECT sobre a tabela `{TABELA}`, com até {LIMITE_LINHAS} linhas no resultado.")
+        with st.expander("Colunas da tabela"):
+            st.dataframe(motor.esquema(), hide_index=True)
+        with st.form("consulta_sql"):
+            sql = st.text_area("SQL:", f"SELECT UF, AVG(renda_media_anual) AS renda_media\nFROM {TABELA}\n"
+                                       "GROUP BY UF\nORDER BY renda_media DESC", height=150)
+            executar = st.form_submit_button("Executar")
+        if executar:
+            try:
+                resultado, truncado = motor.consultar(sql)
+            except (ValueError, TimeoutError) as e_sql:
+                st.error(f"Consulta não executada: {e_sql}")
+                return
+            st.dataframe(resultado, hide_index=True, use_container_width=True)
+            if truncado:
+                st.caption(f"Resultado truncado nas primeiras {LIMITE_LINHAS} linhas.")
+
+
+# Instrumentação opcional (PAINEL_MEDICAO=1): id do rerun para agrupar os
+# registros desta sessão e, se pedido no painel de admin, perfil do rerun
+rerun_id = medicao.iniciar_rerun()
+perfilar_rerun = st.session_state.pop('perfilar_rerun', False)
+try:
+    df = load_data(versao_dados())
+
+    if df.empty:
+        # Não guarda o quadro vazio: o próximo rerun tenta carregar de novo
+        load_data.clear()
+        st.stop()
+
+    motor = load_motor(df.attrs.get('versao'), df)
+    cubo = load_cubo(df.attrs.get('versao'), df, motor)
+
+    st.sidebar.header("Filtros")
+    anos_disponiveis = cubo.anos
+    ano_selecionado = st.sidebar.selectbox("Selecione o Ano:", anos_disponiveis)
+
+    ufs_disponiveis = cubo.ufs
+    uf_selecionada = st.sidebar.selectbox("Selecione a UF (para detalhes):", ["Brasil"] + ufs_disponiveis)
+    no_navegador = st.sidebar.toggle(
+        "Trocar ano e métrica no navegador",
+        help="Ranking, evolução e comparativo bivariado recebem todos os anos de uma vez "
+             "e a escolha de ano e métrica é feita nos controles do próprio gráfico, sem recarregar a página.",
+    )
+
+    # Perfil (cProfile) das seções, se pedido no painel de admin; o perfilador
+    # é desligado mesmo que o rerun seja interrompido no meio
+    with medicao.perfilado(perfilar_rerun) as perfil:
+        secao_kpis(cubo, ano_selecionado)
+        st.divider()
+        secao_mapa(cubo, ano_selecionado)
+        st.divider()
+        secao_ranking(cubo, ano_selecionado, uf_selecionada, no_navegador)
+        st.divider()
+        secao_evolucao(cubo, uf_selecionada, no_navegador)
+        st.divider()
+        secao_comparativo(cubo, ano_selecionado)
+        st.divider()
+        secao_tabela(df)
+        st.divider()
+        secao_bivariado(cubo, ano_selecionado, no_navegador)
+        st.divider()
+        if motor is not None:
+            secao_sql(motor)
+            st.divider()
+    if 'texto' in perfil:
+        st.session_state['perfil_texto'] = perfil['texto']
+
+    # Painel de medição, escondido: só existe com PAINEL_ADMIN_TOKEN definido no
+    # servidor e aparece com ?admin=<token> na URL (liga medição e perfil no processo)
+    token_admin = os.environ.get('PAINEL_ADMIN_TOKEN')
+    if token_admin and hmac.compare_digest(st.query_params.get('admin', '').encode(), token_admin.encode()):
+        with st.sidebar.expander("Medição (admin)", expanded=True):
+            if not medicao.ativo():
+                if st.toggle("Ligar medição neste processo"):
+                    medicao.ativar()
+                    st.rerun()
+                st.caption("Medição desligada (defina PAINEL_MEDICAO=1 para ligar desde o início).")
+            else:
+                registros = medicao.do_rerun(rerun_id)
+                spans = [r for r in registros if r['tipo'] == 'span']
+                if spans:
+                    st.dataframe(
+                        pd.DataFrame(spans).groupby('nome', sort=False)['segundos'].sum()
+                        .mul(1000).round(1).rename('ms').sort_values(ascending=False),
+                        use_container_width=True,
+                    )
+                payloads = [r for r in registros if r['tipo'] == 'payload']
+                if payloads:
+                    st.dataframe(
+                        pd.DataFrame(payloads).groupby(['secao', 'nome'])['bytes'].sum().rename('bytes'),
+                        use_container_width=True,
+                    )
+                caches = medicao.contadores_cache()
+                if caches:
+                    st.dataframe(pd.DataFrame(caches).T, use_container_width=True)
+                st.caption("Cache de figuras: {itens} figuras, {bytes} bytes, {acertos} acertos, "
+                           "{falhas} falhas".format(**cache_figuras().estatisticas()))
+                st.download_button("Baixar registros (JSONL)", medicao.como_jsonl(registros),
+                                   file_name=f"medicao_{rerun_id[:8]}.jsonl", mime="application/json")
+
+            estado_aquecimento = aquecimento.iniciar().estado()
+            st.caption("Aquecimento: {}, versão {}, {} s{}".format(
+                "pronto" if estado_aquecimento['pronto'] else "em andamento",
+                (estado_aquecimento['versao'] or "-")[:12], estado_aquecimento['duracao_s'],
+                f" (erro: {estado_aquecimento['erro']})" if estado_aquecimento['erro'] else ""))
+
+            if st.button("Perfilar o próximo rerun"):
+                st.session_state['perfilar_rerun'] = True
+                st.rerun()
+            if 'perfil_texto' in st.session_state:
+                st.code(st.session_state['perfil_texto'], language=None)
+finally:
+    # Grava os registros do rerun mesmo quando ele é interrompido (st.stop,
+    # st.rerun, exceção), o que também o encerra para os reruns de fragmento
+    medicao.finalizar_rerun(rerun_id)
@@ -0,0 +1,335 @@
+"""Benchmark de latência de rerun do painel, seção por seção.
+
+Roda o app.py sem navegador (``streamlit.testing.v1.AppTest``) sobre
+conjuntos sintéticos gerados a partir do CSV real, multiplicando as UFs
+(escala 1 = 243 linhas; escala 200 ≈ nível de municípios). Para cada passo
+de uma sequência de interações típica mede:
+
+- tempo total do rerun e de cada seção (via ``painel.medicao``);
+- pico de memória Python alocada (``tracemalloc``) por seção e o maior deles
+  no rerun;
+- bytes enviados ao navegador por seção (tamanho dos protos dos elementos).
+
+O AppTest reexecuta o script inteiro a cada interação (não isola
+fragmentos), então os tempos de seção mostram o custo de cada uma num
+rerun completo. O aquecimento em segundo plano (painel/aquecimento.py)
+fica desligado (``PAINEL_AQUECIMENTO=0``), e só entram os registros feitos
+nos reruns do app: a carga fria mede o que o próprio rerun paga.
+
+Cada repetição começa com todos os caches vazios (Streamlit, figuras e
+disco) e percorre a sequência de interações; em seguida, numa sessão nova,
+mede a carga com os caches quentes (``carga_quente``). Assim a mediana
+compara repetições equivalentes e uma execução com ``--repeticoes 1`` é
+comparável à baseline.
+
+    python benchmarks/rerun.py                          # escalas 1, 10 e 100
+    python benchmarks/rerun.py --escalas 1 200 --repeticoes 5
+    python benchmarks/rerun.py --salvar-baseline        # grava a referência
+    python benchmarks/rerun.py --falhar-em-regressao    # compara e sai com 1 se piorar
+
+A comparação com ``benchmarks/baseline.json`` (versionada) cobre tempo,
+pico de memória e bytes enviados, no total e por seção, cada um com a sua
+tolerância (``TOLERANCIAS``, ajustáveis na linha de comando). Tempos
+dependem da máquina: regrave a baseline ao trocar de máquina de
+referência.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+from painel import aquecimento, dados, medicao  # noqa: E402
+from painel.metricas import UF_SIGLA  # noqa: E402
+
+BASELINE_PADRAO = Path(__file__).with_name('baseline.json')
+
+# Aumento relativo tolerado por tipo de medida antes de contar como regressão
+TOLERANCIAS = {'tempo': 0.2, 'memoria': 0.25, 'payload': 0.05}
+# Aumentos absolutos menores que estes são ruído e nunca contam como regressão
+MINIMOS = {'tempo': 0.005, 'memoria': 2**20, 'payload': 1024}
+
+
+def gerar_csv(destino, escala, semente=0):
+    """CSV sintético com ``escala`` cópias de cada UF, com ruído nos valores."""
+    base = pd.read_csv(RAIZ / 'dados_consolidados_corrigido.csv')
+    rng = np.random.default_rng(semente)
+    numericas = [col for col in base.columns if col not in ('UF', 'Ano')]
+    partes = []
+    for k in range(escala):
+        parte = base.copy()
+        if k:
+            parte['UF'] = parte['UF'] + f" {k:04d}"
+            fator = rng.lognormal(0, 0.1, size=(len(parte), len(numericas)))
+            parte[numericas] = parte[numericas] * fator
+            inteiras = [col for col in numericas if pd.api.types.is_integer_dtype(base[col])]
+            parte[inteiras] = parte[inteiras].round().astype('int64')
+        partes.append(parte)
+    pd.concat(partes, ignore_index=True).to_csv(destino, index=False)
+
+
+def gerar_geojson(destino, vertices=2000):
+    """Um polígono por UF real (círculos com ``vertices`` pontos), com id = sigla."""
+    features = []
+    for i, sigla in enumerate(sorted(UF_SIGLA.values())):
+        cx, cy = -70 + (i % 6) * 5, -5 - (i // 6) * 5
+        anel = [[cx + 2 * math.cos(2 * math.pi * k / vertices), cy + 2 * math.sin(2 * math.pi * k / vertices)]
+                for k in range(vertices)]
+        anel.append(anel[0])
+        features.append({'type': 'Feature', 'id': sigla,
+                         'geometry': {'type': 'Polygon', 'coordinates': [anel]}})
+    with open(destino, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def _widget(at, tipo, rotulo, sidebar=False):
+    raiz = at.sidebar if sidebar else at
+    for widget in getattr(raiz, tipo):
+        if widget.label == rotulo:
+            return widget
+    raise LookupError(f"{tipo} '{rotulo}' não encontrado")
+
+
+def _proxima_opcao(widget):
+    opcoes = list(widget.options)
+    return opcoes[(opcoes.index(str(widget.value)) + 1) % len(opcoes)] if str(widget.value) in opcoes else opcoes[-1]
+
+
+def _trocar(tipo, rotulo, sidebar=False, valor=None):
+    def acao(at):
+        widget = _widget(at, tipo, rotulo, sidebar)
+        novo = valor if valor is not None else _proxima_opcao(widget)
+        if tipo == 'selectbox' and rotulo == "Selecione o Ano:":
+            novo = int(novo)
+        widget.set_value(novo)
+    return acao
+
+
+PASSOS = [
+    ('trocar_ano', _trocar('selectbox', "Selecione o Ano:", sidebar=True)),
+    ('metrica_mapa', _trocar('selectbox', "Selecione a Métrica para o Mapa:")),
+    ('metrica_ranking', _trocar('selectbox', "Selecione a Métrica para o Ranking:")),
+    ('selecionar_uf', _trocar('selectbox', "Selecione a UF (para detalhes):", sidebar=True)),
+    ('par_bivariado', _trocar('selectbox', "Selecione o Par de Indicadores para Comparar:")),
+]
+
+
+def _bytes_por_secao(at):
+    """Bytes dos protos de cada bloco do corpo, nomeado pelo cabeçalho da seção."""
+    def tamanho(no):
+        proto = getattr(no, 'proto', None)
+        total = proto.ByteSize() if proto is not None and hasattr(proto, 'ByteSize') else 0
+        filhos = getattr(no, 'children', None)
+        if isinstance(filhos, dict):
+            total += sum(tamanho(filho) for filho in filhos.values())
+        return total
+
+    def cabecalho(no):
+        if type(no).__name__ == 'Header':
+            return no.value
+        filhos = getattr(no, 'children', None)
+        if isinstance(filhos, dict):
+            for filho in filhos.values():
+                achado = cabecalho(filho)
+                if achado:
+                    return achado
+        return None
+
+    secoes = {}
+    for filho in at.main.children.values():
+        nome = cabecalho(filho) if type(filho).__name__ == 'Block' else None
+        secoes[nome or '(fora de seção)'] = secoes.get(nome or '(fora de seção)', 0) + tamanho(filho)
+    return secoes
+
+
+def _rodar(at):
+    medicao.coletar()
+    inicio = time.perf_counter()
+    at.run()
+    segundos = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(f"exceção no app: {at.exception[0].value}")
+    secoes = {}
+    for registro in medicao.coletar():
+        # Registros sem id de rerun vêm de outras threads (aquecimento, API)
+        if registro['tipo'] != 'span' or registro.get('rerun') is None:
+            continue
+        atual = secoes.setdefault(registro['nome'], {'segundos': 0.0, 'pico_bytes': 0})
+        atual['segundos'] += registro['segundos']
+        atual['pico_bytes'] = max(atual['pico_bytes'], registro.get('pico_bytes', 0))
+    # Cada trecho externo zera o pico do tracemalloc ao começar (ver painel.medicao),
+    # então o pico do rerun é o maior entre os das seções e etapas de carga
+    pico = max((v['pico_bytes'] for v in secoes.values()), default=0)
+    return {'segundos': segundos, 'pico_bytes': pico, 'secoes': secoes,
+            'payload_bytes': _bytes_por_secao(at)}
+
+
+def medir_escala(escala, repeticoes, timeout):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        gerar_csv(os.path.join(tmp, 'dados_consolidados_corrigido.csv'), escala)
+        gerar_geojson(os.path.join(tmp, 'brasil_estados.json'))
+        anterior = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for _ in range(repeticoes):
+                # Toda repetição começa fria: sem caches do Streamlit, sem o cache de
+                # figuras do processo e sem o cache em disco (quadro e geometria)
+                st.cache_data.clear()
+                st.cache_resource.clear()
+                aquecimento.cache_figuras().limpar()
+                shutil.rmtree(os.path.join(tmp, dados.DIR_CACHE), ignore_errors=True)
+                at = AppTest.from_file(str(RAIZ / 'app.py'), default_timeout=timeout)
+                for nome, acao in [('carga_fria', None)] + PASSOS:
+                    if acao is not None:
+                        acao(at)
+                    resultados.setdefault(nome, []).append(_rodar(at))
+                # Fase separada: uma sessão nova com os caches já quentes
+                at = AppTest.from_file(str(RAIZ / 'app.py'), default_timeout=timeout)
+                resultados.setdefault('carga_quente', []).append(_rodar(at))
+        finally:
+            os.chdir(anterior)
+    ordem = ['carga_fria', 'carga_quente'] + [nome for nome, _ in PASSOS]
+    return {nome: _resumir(resultados[nome]) for nome in ordem if nome in resultados}
+
+
+def _resumir(execucoes):
+    """Mediana de cada medida entre as repetições.
+
+    Um trecho que não aparece numa repetição (por exemplo a montagem de uma
+    figura que veio do cache) conta como 0 nela, para que a mediana de um
+    trecho nunca passe a da seção que o contém; ``frequencia`` é a fração das
+    repetições em que ele apareceu.
+    """
+    nomes = list(dict.fromkeys(nome for e in execucoes for nome in e['secoes']))
+    secoes = {}
+    for nome in nomes:
+        presentes = [e['secoes'][nome] for e in execucoes if nome in e['secoes']]
+        chaves = list(dict.fromkeys(chave for v in presentes for chave in v))
+        secoes[nome] = {chave: statistics.median(e['secoes'].get(nome, {}).get(chave, 0) for e in execucoes)
+                        for chave in chaves}
+        secoes[nome]['frequencia'] = len(presentes) / len(execucoes)
+    payload = {}
+    for execucao in execucoes:
+        for nome, valor in execucao['payload_bytes'].items():
+            payload.setdefault(nome, []).append(valor)
+    return {
+        'segundos': statistics.median(e['segundos'] for e in execucoes),
+        'pico_bytes': int(statistics.median(e['pico_bytes'] for e in execucoes)),
+        'secoes': secoes,
+        'payload_bytes': {nome: int(statistics.median(v)) for nome, v in payload.items()},
+    }
+
+
+def imprimir(resultados):
+    for escala, passos in resultados.items():
+        print(f"\n== escala {escala} ==")
+        for passo, r in passos.items():
+            secoes = ', '.join(f"{nome} {v['segundos'] * 1000:.0f}ms" for nome, v in
+                               sorted(r['secoes'].items(), key=lambda item: -item[1]['segundos']))
+            print(f"{passo:16s} {r['segundos'] * 1000:8.0f} ms  pico {r['pico_bytes'] / 2**20:6.1f} MiB  "
+                  f"payload {sum(r['payload_bytes'].values()) / 1024:7.1f} KiB  | {secoes}")
+
+
+def _medidas(r):
+    """(tipo, nome, valor) de cada medida comparável de um passo: tempo, memória e payload."""
+    yield 'tempo', 'total', r['segundos']
+    yield 'memoria', 'total', r['pico_bytes']
+    yield 'payload', 'total', sum(r['payload_bytes'].values())
+    for nome, v in r['secoes'].items():
+        yield 'tempo', nome, v['segundos']
+        if 'pico_bytes' in v:
+            yield 'memoria', nome, v['pico_bytes']
+    for nome, valor in r['payload_bytes'].items():
+        yield 'payload', nome, valor
+
+
+def _formatar(tipo, valor):
+    if tipo == 'tempo':
+        return f"{valor * 1000:8.1f} ms"
+    if tipo == 'memoria':
+        return f"{valor / 2**20:7.2f} MiB"
+    return f"{valor / 1024:7.1f} KiB"
+
+
+def comparar(resultados, baseline, tolerancias):
+    """Lista de regressões: medidas acima de baseline * (1 + tolerância do tipo)
+    e com aumento absoluto maior que o mínimo do tipo (ruído de medida)."""
+    regressoes = []
+    for escala, passos in resultados.items():
+        for passo, r in passos.items():
+            ref = baseline.get(escala, {}).get(passo)
+            if ref is None:
+                continue
+            referencias = {(tipo, nome): valor for tipo, nome, valor in _medidas(ref)}
+            for tipo, nome, atual in _medidas(r):
+                referencia = referencias.get((tipo, nome))
+                if referencia is None:
+                    continue
+                razao = atual / referencia if referencia else (1.0 if not atual else math.inf)
+                marca = ''
+                if razao > 1 + tolerancias[tipo] and atual - referencia > MINIMOS[tipo]:
+                    marca = '  <-- regressão'
+                    regressoes.append((escala, passo, tipo, nome, razao))
+                if nome != 'total' and not marca:
+                    continue  # das seções, só as regressões
+                print(f"escala {escala:>4} {passo:16s} {tipo:8s} {nome[:28]:28s} "
+                      f"{_formatar(tipo, referencia)} -> {_formatar(tipo, atual)} ({razao:5.2f}x){marca}")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PADRAO)
+    parser.add_argument('--salvar-baseline', action='store_true')
+    parser.add_argument('--saida', type=Path, help="grava os resultados em JSON")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIAS['tempo'],
+                        help="aumento relativo de tempo considerado regressão (padrão %(default)s)")
+    parser.add_argument('--tolerancia-memoria', type=float, default=TOLERANCIAS['memoria'],
+                        help="aumento relativo do pico de memória considerado regressão (padrão %(default)s)")
+    parser.add_argument('--tolerancia-payload', type=float, default=TOLERANCIAS['payload'],
+                        help="aumento relativo dos bytes enviados considerado regressão (padrão %(default)s)")
+    parser.add_argument('--falhar-em-regressao', action='store_true')
+    args = parser.parse_args(argv)
+
+    os.environ['PAINEL_AQUECIMENTO'] = '0'
+    medicao.ativar()  # liga também o tracemalloc
+    resultados = {str(escala): medir_escala(escala, args.repeticoes, args.timeout) for escala in args.escalas}
+    imprimir(resultados)
+
+    if args.saida:
+        args.saida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding='utf-8')
+    if args.salvar_baseline:
+        args.baseline.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\nBaseline gravada em {args.baseline}")
+        return 0
+
+    if args.baseline.exists():
+        print(f"\nComparação com {args.baseline}:")
+        tolerancias = {'tempo': args.tolerancia, 'memoria': args.tolerancia_memoria,
+                       'payload': args.tolerancia_payload}
+        regressoes = comparar(resultados, json.loads(args.baseline.read_text(encoding='utf-8')), tolerancias)
+        if regressoes and args.falhar_em_regressao:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
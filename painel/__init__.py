@@ -0,0 +1,28 @@
+"""Camada de dados do Painel Socioeconômico (sem dependência do Streamlit).
+
+- ``painel.dados``: leitura do CSV, taxas derivadas e cache colunar em disco
+- ``painel.metricas``: métricas exibidas, siglas das UFs e pares bivariados
+- ``painel.agregados``: cubo de agregados por ano, UF e métrica
+- ``painel.series``: variação anual, CAGR, média móvel e índice das séries
+- ``painel.posicoes``: índice de posições, percentis e variações por ano
+- ``painel.correlacao``: tensor de correlações e pares bivariados
+- ``painel.consultas``: motor SQL embutido (DuckDB, opcional) sobre o quadro
+- ``painel.tabela``: tabela paginada com ordens pré-calculadas e exportação
+- ``painel.geo``: geometria das UFs simplificada para o mapa
+- ``painel.ingestao``: ingestão incremental de partições (UF, Ano)
+- ``painel.graficos``: montagem das figuras (Plotly e Altair)
+- ``painel.figuras``: cache das especificações de figuras
+- ``painel.relatorio``: relatórios estáticos de todas as combinações
+- ``painel.api``: API JSON somente leitura com os agregados, com ETag e gzip
+- ``painel.interativo``: gráficos Vega-Lite com ano e métrica trocados no navegador
+- ``painel.aquecimento``: aquecimento dos caches e prontidão do servidor
+- ``painel.medicao``: medição opcional de tempo, memória e caches
+
+Exemplo de uso fora do painel::
+
+    from painel import dados
+    from painel.agregados import Cubo
+
+    cubo = Cubo(dados.carregar())
+    cubo.valor_nacional(2023, 'renda_media_anual')
+"""
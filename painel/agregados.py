@@ -0,0 +1,171 @@
+"""Cubo de agregados (Ano × UF × métrica) montado uma vez por versão dos dados.
+
+As seções do painel consultam o cubo em vez de filtrar e copiar o quadro
+bruto a cada interação: o recorte de um ano, a série de uma UF, os
+agregados nacionais e os rankings já ordenados são todos pré-calculados.
+
+Os agregados nacionais seguem a regra de cada métrica no registro: soma
+para contagens e população, média ponderada pela população para taxas,
+percentuais e renda.
+
+Com um ``painel.consultas.Motor``, o cubo lê do motor só as colunas e
+partições de que precisa e recebe dele os agregados nacionais, em vez de
+filtrar e agrupar o quadro em pandas.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from .dados import CASAS_FLOAT32
+from .medicao import medido
+from .metricas import COLUNA_POPULACAO, METRICAS, SOMA, agregacao
+
+
+def agregados_nacionais(anos, valores, pesos):
+    """Somas e médias ponderadas por ano de uma matriz (linha, métrica).
+
+    ``anos`` tem o ano de cada linha e ``pesos`` a população. Tudo sai de uma
+    única multiplicação da matriz indicadora dos anos pelos blocos empilhados
+    (valores, contagens, pesos e valores ponderados). Anos sem peso (população
+    zerada ou ausente) caem na média simples.
+    """
+    anos_unicos, idx = np.unique(anos, return_inverse=True)
+    indicadora = (idx[None, :] == np.arange(len(anos_unicos))[:, None]).astype(float)
+
+    validos = ~np.isnan(valores)
+    pesos = np.nan_to_num(np.asarray(pesos, dtype=float))[:, None]
+    v = np.where(validos, valores, 0.0)
+    blocos = indicadora @ np.hstack([v, validos, validos * pesos, v * pesos])
+    soma, contagem, peso, soma_ponderada = np.split(blocos, 4, axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = soma / contagem
+        media_ponderada = np.where(peso > 0, soma_ponderada / peso, media)
+    soma[contagem == 0] = np.nan
+    return anos_unicos, soma, media_ponderada
+
+
+class Cubo:
+
+    @medido('cubo.montar')
+    def __init__(self, df, colunas=None, motor=None):
+        self.versao = df.attrs.get('versao')
+        # Versão de onde este cubo foi atualizado e os anos recalculados (None = todos)
+        self.versao_anterior = None
+        self.anos_alterados = None
+        if colunas is None:
+            colunas = METRICAS.values()
+        self.colunas = [col for col in dict.fromkeys(colunas) if col in df.columns]
+        self._motor = motor
+
+        self._por_ano = {}
+        self._por_uf = {}
+        self._ranking = {}
+        self.nacional = None
+        self._montar(df)
+
+    def _valores(self, df, anos=None, ufs=None):
+        if self._motor is not None:
+            return self._motor.valores(self.colunas, anos, ufs)
+        if anos is not None:
+            df = df[df['Ano'].isin(anos)]
+        if ufs is not None:
+            df = df[df['UF'].isin(ufs)]
+        # O cubo trabalha em float64 e com UF/Ano simples, qualquer que seja o
+        # tipo compacto do quadro de origem (categórica, int16, Int32, float32)
+        valores = pd.DataFrame({'UF': df['UF'].astype(object), 'Ano': df['Ano'].astype('int64')})
+        for col in self.colunas:
+            serie = pd.to_numeric(df[col], errors='coerce')
+            if serie.dtype == np.float32:
+                # float32 só é usado quando preserva CASAS_FLOAT32 casas; o
+                # arredondamento devolve o valor decimal original
+                valores[col] = serie.astype('float64').round(CASAS_FLOAT32)
+            else:
+                valores[col] = serie.astype('float64')
+        pesos = pd.to_numeric(df[COLUNA_POPULACAO], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        return valores, pesos
+
+    def _montar(self, df, anos=None, ufs=None):
+        """Calcula os agregados de ``df``; com ``anos``/``ufs``, só dessas partições."""
+        valores, pesos = self._valores(df, anos)
+
+        # Recortes por ano (índice UF)
+        for ano, grupo in valores.groupby('Ano'):
+            recorte = grupo.drop(columns='Ano').set_index('UF')
+            self._por_ano[ano] = recorte
+            # Rankings: valores válidos do ano em ordem decrescente
+            for col in self.colunas:
+                self._ranking[(ano, col)] = recorte[col].dropna().sort_values(ascending=False, kind='stable')
+
+        # Agregados nacionais por ano (índice Ano, colunas = métricas)
+        if self._motor is not None:
+            nacional = self._motor.nacional(self.colunas, anos)
+            anos_calc = nacional.index
+        else:
+            anos_calc, soma, media_ponderada = agregados_nacionais(
+                valores['Ano'].to_numpy(), valores[self.colunas].to_numpy(dtype=float), pesos
+            )
+            por_soma = np.array([agregacao(col) == SOMA for col in self.colunas])
+            nacional = pd.DataFrame(
+                np.where(por_soma, soma, media_ponderada),
+                index=pd.Index(anos_calc, name='Ano'), columns=self.colunas
+            )
+        if self.nacional is not None:
+            nacional = pd.concat([self.nacional.drop(index=anos_calc, errors='ignore'), nacional]).sort_index()
+        self.nacional = nacional
+
+        # Recortes por UF (índice Ano)
+        if ufs is not None:
+            valores, _ = self._valores(df, ufs=ufs)
+        for uf, grupo in valores.groupby('UF'):
+            self._por_uf[uf] = grupo.drop(columns='UF').set_index('Ano').sort_index()
+
+        self.anos = sorted(self._por_ano, reverse=True)
+        self.ufs = sorted(self._por_uf)
+
+    @medido('cubo.atualizar')
+    def atualizado(self, df, motor=None):
+        """Cubo da versão de ``df``, recalculando só as partições alteradas.
+
+        Vale quando ``df`` foi publicado por uma ingestão sobre a versão deste
+        cubo (``df.attrs`` traz a versão anterior e as partições); em qualquer
+        outro caso o cubo é montado do zero. ``motor``, se dado, é o da versão
+        de ``df``.
+        """
+        particoes = df.attrs.get('particoes')
+        if not particoes or df.attrs.get('versao_anterior') != self.versao:
+            return Cubo(df, self.colunas, motor)
+
+        novo = copy.copy(self)
+        novo._por_ano = dict(self._por_ano)
+        novo._por_uf = dict(self._por_uf)
+        novo._ranking = dict(self._ranking)
+        novo._motor = motor
+        novo.versao = df.attrs.get('versao')
+        novo.versao_anterior = self.versao
+        anos = sorted({ano for _, ano in particoes})
+        novo.anos_alterados = anos
+        novo._montar(df, anos, {uf for uf, _ in particoes})
+        return novo
+
+    def ano(self, ano):
+        """Valores das métricas no ano, indexados por UF."""
+        return self._por_ano[ano]
+
+    def quadro(self):
+        """Todos os recortes anuais num único quadro (colunas UF, Ano e métricas)."""
+        recortes = [self._por_ano[ano].assign(Ano=ano) for ano in sorted(self._por_ano)]
+        return pd.concat(recortes).reset_index()[['UF', 'Ano'] + list(self.colunas)]
+
+    def uf(self, uf):
+        """Série histórica das métricas da UF, indexada por Ano."""
+        return self._por_uf[uf]
+
+    def valor_nacional(self, ano, col):
+        """Agregado nacional da métrica no ano, pela regra do registro."""
+        return self.nacional.at[ano, col]
+
+    def ranking(self, ano, col):
+        """Série (índice UF) com os valores válidos do ano, do maior para o menor."""
+        return self._ranking[(ano, col)]
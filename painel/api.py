@@ -0,0 +1,336 @@
+"""API JSON somente leitura com os mesmos agregados do painel.
+
+Serve, a partir do cubo, das posições e das correlações de cada versão dos
+dados, os números que o app calcula: agregados nacionais, valores por UF,
+rankings e matrizes de correlação. Outras ferramentas consultam a API em
+vez de reler o CSV ou raspar o painel.
+
+Todas as respostas levam o ETag da versão dos dados (``W/"<api>-<versão>"``):
+com ``If-None-Match`` igual e parâmetros válidos, a resposta é ``304`` sem
+corpo, então consultar periodicamente custa só a checagem da versão e dos
+parâmetros. Corpos acima de
+``MINIMO_GZIP`` bytes saem comprimidos quando o cliente aceita gzip. As
+rotas aceitam várias métricas, UFs e anos de uma vez, separados por vírgula.
+
+    python -m painel.api [--porta 8502] [--host 127.0.0.1]
+
+Rotas (GET)::
+
+    /v1/versao
+    /v1/metricas
+    /v1/nacional?metricas=a,b&anos=2022,2023
+    /v1/valores?metricas=a,b&anos=2023&ufs=Bahia,Ceará
+    /v1/ranking?ano=2023&metricas=a,b&n=10
+    /v1/correlacoes?ano=2023&metodo=pearson|spearman
+"""
+import argparse
+import gzip
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from . import dados
+from .agregados import Cubo
+from .correlacao import Correlacoes
+from .metricas import REGISTRO
+from .posicoes import Posicoes
+
+# Prefixo dos ETags (W/"<VERSAO_API>-<versão dos dados>"): com outro número, quem
+# guardou respostas no formato antigo recebe 200 em vez de 304
+VERSAO_API = 1
+PORTA = 8502
+
+# Intervalo mínimo, em segundos, entre checagens de versão nova dos dados
+INTERVALO_VERSAO = 2.0
+MINIMO_GZIP = 1024
+MAXIMO_RESPOSTAS = 512
+
+
+class RequisicaoInvalida(ValueError):
+    pass
+
+
+class Agregados:
+    """Cubo, posições e correlações da versão atual, trocados quando ela muda."""
+
+    def __init__(self, caminho_csv=dados.CAMINHO_CSV, dir_cache=dados.DIR_CACHE):
+        self.caminho_csv = caminho_csv
+        self.dir_cache = dir_cache
+        self._trava = threading.Lock()
+        self._estado = None
+        self._checado = 0.0
+        self._respostas = OrderedDict()
+
+    def atual(self):
+        """(versão, cubo, posições, correlações), recarregados se houver versão nova."""
+        with self._trava:
+            agora = time.monotonic()
+            if self._estado is None or agora - self._checado >= INTERVALO_VERSAO:
+                self._checado = agora
+                versao = dados.versao_atual(self.caminho_csv, self.dir_cache)
+                if self._estado is None or self._estado[0] != versao:
+                    self._estado = self._montar()
+                    self._respostas.clear()
+            return self._estado
+
+    def _montar(self):
+        df = dados.carregar(self.caminho_csv, self.dir_cache)
+        anterior = self._estado
+        if anterior is not None:
+            cubo = anterior[1].atualizado(df)
+            correlacoes = anterior[3].atualizado(cubo)
+        else:
+            cubo = Cubo(df)
+            correlacoes = Correlacoes(cubo)
+        return cubo.versao, cubo, Posicoes(cubo), correlacoes
+
+    def resposta(self, versao, chave, montar, comprimida=False):
+        """Corpo JSON (bytes) da rota, guardado por versão e parâmetros, puro ou em gzip."""
+        with self._trava:
+            corpos = self._respostas.get((versao, chave))
+            if corpos is not None:
+                self._respostas.move_to_end((versao, chave))
+        if corpos is None:
+            corpo = json.dumps({'versao': versao, 'dados': montar()}, ensure_ascii=False,
+                               allow_nan=False, default=_json).encode('utf-8')
+            corpos = {False: corpo}
+            with self._trava:
+                self._respostas[(versao, chave)] = corpos
+                while len(self._respostas) > MAXIMO_RESPOSTAS:
+                    self._respostas.popitem(last=False)
+        if comprimida and len(corpos[False]) >= MINIMO_GZIP:
+            if True not in corpos:
+                corpos[True] = gzip.compress(corpos[False], compresslevel=6)
+            return corpos[True], True
+        return corpos[False], False
+
+
+def _json(valor):
+    # Escalares do numpy (int64, float32) viram tipos do Python
+    if hasattr(valor, 'item'):
+        return valor.item()
+    raise TypeError(f"Valor não serializável: {type(valor).__name__}")
+
+
+def _registros(df):
+    """Linhas do quadro como dicionários, com NaN em ``None`` (``null`` no JSON)."""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _lista(parametros, nome, validos=None, obrigatorio=False):
+    valores = [v for item in parametros.get(nome, []) for v in item.split(',') if v]
+    if not valores:
+        if obrigatorio:
+            raise RequisicaoInvalida(f"Parâmetro obrigatório ausente: {nome}")
+        return None
+    if validos is not None:
+        desconhecidos = [v for v in valores if v not in validos]
+        if desconhecidos:
+            raise RequisicaoInvalida(f"Valores desconhecidos em {nome}: {', '.join(desconhecidos)}")
+    return list(dict.fromkeys(valores))
+
+
+def _anos(parametros, cubo, nome='anos', obrigatorio=False):
+    valores = _lista(parametros, nome, obrigatorio=obrigatorio)
+    if valores is None:
+        return sorted(cubo.anos)
+    try:
+        anos = [int(v) for v in valores]
+    except ValueError:
+        raise RequisicaoInvalida(f"Ano inválido em {nome}: {', '.join(valores)}") from None
+    faltando = [ano for ano in anos if ano not in cubo.anos]
+    if faltando:
+        raise RequisicaoInvalida(f"Anos sem dados: {', '.join(map(str, faltando))}")
+    return anos
+
+
+def _metricas(parametros, cubo):
+    return _lista(parametros, 'metricas', cubo.colunas) or list(cubo.colunas)
+
+
+def rota_versao(agregados, parametros):
+    versao, cubo, _, _ = agregados
+    return {'versao': versao, 'anos': sorted(cubo.anos), 'ufs': cubo.ufs}
+
+
+def rota_metricas(agregados, parametros):
+    colunas = set(agregados[1].colunas)
+    return [asdict(metrica) for metrica in REGISTRO if metrica.coluna in colunas]
+
+
+def rota_nacional(agregados, parametros):
+    _, cubo, _, _ = agregados
+    colunas = _metricas(parametros, cubo)
+    anos = _anos(parametros, cubo)
+    return _registros(cubo.nacional.loc[anos, colunas].reset_index())
+
+
+def rota_valores(agregados, parametros):
+    _, cubo, _, _ = agregados
+    colunas = _metricas(parametros, cubo)
+    ufs = _lista(parametros, 'ufs', cubo.ufs)
+    registros = []
+    for ano in _anos(parametros, cubo):
+        recorte = cubo.ano(ano)
+        recorte = recorte.loc[[uf for uf in ufs if uf in recorte.index]] if ufs else recorte
+        registros += _registros(recorte[colunas].rename_axis('UF').reset_index().assign(Ano=ano)[['UF', 'Ano'] + colunas])
+    return registros
+
+
+def rota_ranking(agregados, parametros):
+    _, cubo, posicoes, _ = agregados
+    ano = _anos(parametros, cubo, 'ano', obrigatorio=True)[0]
+    try:
+        n = int(parametros.get('n', ['10'])[0])
+    except ValueError:
+        raise RequisicaoInvalida("n deve ser um número inteiro") from None
+    rankings = {}
+    for col in _metricas(parametros, cubo):
+        serie = cubo.ranking(ano, col).head(max(n, 0))
+        rankings[col] = [
+            {'UF': uf, 'valor': valor, 'posicao': int(posicoes.posicao_de(ano, uf, col))}
+            for uf, valor in serie.items()
+        ]
+    return {'ano': ano, 'rankings': rankings}
+
+
+def rota_correlacoes(agregados, parametros):
+    _, cubo, _, correlacoes = agregados
+    ano = _anos(parametros, cubo, 'ano', obrigatorio=True)[0]
+    metodo = parametros.get('metodo', ['pearson'])[0]
+    if metodo not in ('pearson', 'spearman'):
+        raise RequisicaoInvalida("metodo deve ser pearson ou spearman")
+    colunas = _metricas(parametros, cubo)
+    matriz = correlacoes.matriz(ano, metodo).loc[colunas, colunas]
+    return {'ano': ano, 'metodo': metodo, 'colunas': colunas,
+            'matriz': matriz.astype(object).where(matriz.notna(), None).to_numpy().tolist()}
+
+
+ROTAS = {
+    '/v1/versao': rota_versao,
+    '/v1/metricas': rota_metricas,
+    '/v1/nacional': rota_nacional,
+    '/v1/valores': rota_valores,
+    '/v1/ranking': rota_ranking,
+    '/v1/correlacoes': rota_correlacoes,
+}
+
+
+def etag(versao):
+    return f'W/"{VERSAO_API}-{versao}"'
+
+
+def _casa_etag(cabecalho, atual):
+    # Comparação fraca (RFC 9110): o prefixo W/ não conta
+    if cabecalho is None:
+        return False
+    candidatos = [item.strip() for item in cabecalho.split(',')]
+    return '*' in candidatos or any(c.removeprefix('W/') == atual.removeprefix('W/') for c in candidatos)
+
+
+def _aceita_gzip(cabecalho):
+    for item in (cabecalho or '').split(','):
+        codificacao, _, parametro = item.strip().partition(';')
+        if codificacao.strip().lower() in ('gzip', '*'):
+            return parametro.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    server_version = "PainelAPI/1"
+    agregados = None
+
+    def do_GET(self):
+        self._responder(com_corpo=True)
+
+    def do_HEAD(self):
+        self._responder(com_corpo=False)
+
+    def _responder(self, com_corpo):
+        url = urlsplit(self.path)
+        rota = ROTAS.get(url.path.rstrip('/') or '/')
+        if rota is None:
+            return self._erro(HTTPStatus.NOT_FOUND, f"Rota desconhecida: {url.path}", com_corpo)
+
+        estado = self.agregados.atual()
+        versao = estado[0]
+        marca = etag(versao)
+        casa = _casa_etag(self.headers.get('If-None-Match'), marca)
+
+        # Parâmetros inválidos dão 400 mesmo com o ETag certo; o corpo fica
+        # guardado por versão e parâmetros, então a revalidação segue barata
+        parametros = parse_qs(url.query)
+        chave = (url.path, tuple(sorted((k, tuple(v)) for k, v in parametros.items())))
+        try:
+            corpo, comprimida = self.agregados.resposta(
+                versao, chave, lambda: rota(estado, parametros),
+                not casa and _aceita_gzip(self.headers.get('Accept-Encoding')))
+        except RequisicaoInvalida as erro:
+            return self._erro(HTTPStatus.BAD_REQUEST, str(erro), com_corpo)
+
+        if casa:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._cabecalhos_cache(marca)
+            self.end_headers()
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self._cabecalhos_cache(marca)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if comprimida:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        if com_corpo:
+            self.wfile.write(corpo)
+
+    def _cabecalhos_cache(self, marca):
+        self.send_header('ETag', marca)
+        # O cliente pode guardar a resposta, mas revalida a cada uso (If-None-Match)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+
+    def _erro(self, status, mensagem, com_corpo):
+        corpo = json.dumps({'erro': mensagem}, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        if com_corpo:
+            self.wfile.write(corpo)
+
+
+def servidor(host='127.0.0.1', porta=PORTA, caminho_csv=dados.CAMINHO_CSV, dir_cache=dados.DIR_CACHE):
+    """Servidor HTTP (ainda não iniciado) com os agregados já carregados."""
+    agregados = Agregados(caminho_csv, dir_cache)
+    agregados.atual()
+    manipulador = type('ManipuladorPainel', (Manipulador,), {'agregados': agregados})
+    return ThreadingHTTPServer((host, porta), manipulador)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=PORTA)
+    parser.add_argument('--csv', default=dados.CAMINHO_CSV)
+    args = parser.parse_args(argv)
+
+    http = servidor(args.host, args.porta, args.csv)
+    print(f"API em http://{args.host}:{args.porta}/v1/versao")
+    try:
+        http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
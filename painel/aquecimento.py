@@ -0,0 +1,278 @@
+"""Aquecimento dos caches na subida do servidor e a cada versão nova dos dados.
+
+Sem aquecimento, o primeiro usuário depois de um deploy (ou de uma
+ingestão) paga tudo: leitura dos dados, GeoJSON, cubo, índices e as
+primeiras figuras. Aqui uma thread em segundo plano monta esses objetos
+assim que o processo sobe e volta a montá-los quando a versão dos dados
+(ou do GeoJSON) muda, sem esperar pelo próximo acesso.
+
+Os objetos ficam num registro do processo, chaveados como os loaders do
+app (versão dos dados; caminho e mtime da geometria), e cada um é
+publicado assim que fica pronto. Os loaders decorados com ``preaquecido``
+devolvem o objeto aquecido quando a chave confere (esperando só por ele,
+se o aquecimento em andamento ainda vai publicá-lo) e, senão, montam por
+conta própria. As figuras da
+visão padrão (mapa e ranking do ano mais recente na primeira métrica) vão
+para o cache de figuras do processo com as mesmas chaves que o app usa.
+
+A prontidão fica em ``estado()`` e, para o balanceador de carga, num
+endpoint HTTP (``servir_prontidao``): ``/pronto`` responde 200 depois do
+primeiro aquecimento completo e 503 antes dele; ``/saude`` responde 200
+enquanto o processo estiver de pé. ``servidor.py``, na raiz, sobe o
+aquecimento e o endpoint antes do Streamlit.
+"""
+import errno
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import consultas, dados, figuras, geo, graficos
+from .agregados import Cubo
+from .correlacao import Correlacoes, RegistroPares
+from .metricas import METRICAS
+from .posicoes import Posicoes
+from .series import SeriesTemporais
+from .tabela import Tabela
+
+CAMINHO_GEOJSON = 'brasil_estados.json'
+
+# O endpoint de prontidão de cada processo fica na porta do Streamlit + 1000
+# (8501 -> 9501), para que vários processos na mesma máquina não disputem a porta
+DESLOCAMENTO_PRONTIDAO = 1000
+PORTA_PRONTIDAO = 8501 + DESLOCAMENTO_PRONTIDAO
+
+# Intervalo, em segundos, entre checagens de versão nova dos dados e do GeoJSON
+INTERVALO_VERSAO = 5.0
+
+# Quanto um loader espera pelo seu objeto num aquecimento em andamento antes de montar sozinho
+ESPERA_MONTAGEM = 120.0
+
+# Objetos derivados dos dados, na ordem em que o aquecimento os publica
+DADOS = ('dados', 'motor', 'cubo', 'correlacoes', 'pares', 'posicoes', 'series', 'tabela')
+
+_FIGURAS = figuras.CacheFiguras()
+_instancia = None
+_trava_instancia = threading.Lock()
+
+
+def cache_figuras():
+    """Cache de figuras do processo, compartilhado pelo app e pelo aquecimento."""
+    return _FIGURAS
+
+
+class Aquecimento:
+    """Monta e renova em segundo plano os objetos derivados da versão atual."""
+
+    def __init__(self, caminho_csv=dados.CAMINHO_CSV, caminho_geojson=CAMINHO_GEOJSON,
+                 intervalo=INTERVALO_VERSAO):
+        self.caminho_csv = caminho_csv
+        self.caminho_geojson = caminho_geojson
+        self.intervalo = intervalo
+        # nome -> (chave, objeto), publicado objeto a objeto durante o aquecimento
+        self._objetos = {}
+        # nome -> evento dos objetos que o aquecimento em andamento ainda vai publicar
+        self._pendentes = {}
+        self._montagem = threading.Lock()
+        self._pronto = threading.Event()
+        self._thread = None
+        self.versao = None
+        self.mtime_geojson = None
+        self.erro = None
+        self.duracao = None
+        self.atualizado_em = None
+
+    def iniciar(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._laco, name='aquecimento', daemon=True)
+            self._thread.start()
+        return self
+
+    def _laco(self):
+        while True:
+            try:
+                self.atualizar()
+                self.erro = None
+            except Exception as erro:  # o app continua montando sob demanda
+                self.erro = f"{type(erro).__name__}: {erro}"
+            time.sleep(self.intervalo)
+
+    def _mtime_geojson(self):
+        try:
+            return os.path.getmtime(self.caminho_geojson)
+        except OSError:
+            return None
+
+    def atualizar(self):
+        """Aquece a versão atual se ela (ou o GeoJSON) mudou; devolve se aqueceu."""
+        versao = dados.versao_atual(self.caminho_csv)
+        mtime = self._mtime_geojson()
+        if versao == self.versao and mtime == self.mtime_geojson:
+            return False
+        with self._montagem:
+            inicio = time.perf_counter()
+            nomes = (DADOS if versao != self.versao else ()) + (('geometria',) if mtime is not None else ())
+            self._pendentes = {nome: threading.Event() for nome in nomes}
+            try:
+                self._montar(versao, mtime)
+                self.versao, self.mtime_geojson = versao, mtime
+                self._aquecer_figuras()
+            finally:
+                # Em caso de erro, quem esperava segue e monta por conta própria
+                for evento in self._pendentes.values():
+                    evento.set()
+                self._pendentes = {}
+            self.duracao = time.perf_counter() - inicio
+            self.atualizado_em = time.time()
+        self._pronto.set()
+        return True
+
+    def _publicar(self, nome, chave, objeto):
+        # Cada objeto fica disponível assim que é montado, sem esperar os demais
+        self._objetos[nome] = (chave, objeto)
+        evento = self._pendentes.get(nome)
+        if evento is not None:
+            evento.set()
+
+    def _montar(self, versao, mtime):
+        anteriores = dict(self._objetos)
+        if versao != self.versao:
+            df = dados.carregar(self.caminho_csv)
+            chave = (df.attrs.get('versao'),)
+            self._publicar('dados', (versao,), df)
+            motor = consultas.Motor(df) if consultas.disponivel() else None
+            self._publicar('motor', chave, motor)
+            # Atualização incremental a partir do cubo e das correlações anteriores
+            cubo_anterior = anteriores.get('cubo', (None, None))[1]
+            cubo = cubo_anterior.atualizado(df, motor) if cubo_anterior is not None else Cubo(df, motor=motor)
+            self._publicar('cubo', chave, cubo)
+            correlacoes_anteriores = anteriores.get('correlacoes', (None, None))[1]
+            self._publicar('correlacoes', chave, correlacoes_anteriores.atualizado(cubo)
+                           if correlacoes_anteriores is not None else Correlacoes(cubo))
+            self._publicar('pares', chave, RegistroPares(cubo))
+            self._publicar('posicoes', chave, Posicoes(cubo))
+            self._publicar('series', chave, SeriesTemporais(cubo))
+            self._publicar('tabela', chave, Tabela(df, ['UF', 'Ano'] + list(METRICAS.values())))
+        if mtime is None:
+            self._objetos.pop('geometria', None)
+        elif mtime != self.mtime_geojson or 'geometria' not in self._objetos:
+            self._publicar('geometria', (self.caminho_geojson, mtime), geo.carregar(self.caminho_geojson))
+
+    def _aquecer_figuras(self):
+        # Mesmas chaves e figuras que mostrar_figura monta na visão padrão do app
+        # (ano mais recente e primeira métrica do registro no mapa e no ranking)
+        cubo = self._objetos['cubo'][1]
+        ano = cubo.anos[0]
+        nome, col = next(iter(METRICAS.items()))
+        serie = cubo.ranking(ano, col)
+        if not serie.empty:
+            _FIGURAS.aquecer((cubo.versao, 'ranking', 'maiores', ano, col),
+                             lambda: graficos.ranking(serie, col, nome))
+            _FIGURAS.aquecer((cubo.versao, 'ranking', 'menores', ano, col),
+                             lambda: graficos.ranking(serie, col, nome, maiores=False))
+        if 'geometria' in self._objetos:
+            df_mapa = graficos.dados_mapa(cubo, ano, col).dropna(subset=['UF_Sigla'])
+            geojson = self._objetos['geometria'][1].nivel(geo.NIVEL_MAPA)
+            if not df_mapa.empty:
+                _FIGURAS.aquecer((cubo.versao, 'mapa', 'choropleth', ano, col, self.mtime_geojson),
+                                 lambda: graficos.mapa(df_mapa, geojson, col, nome, ano))
+
+    def obter(self, nome, argumentos):
+        """Objeto aquecido ``nome`` se a chave dele confere com o início de
+        ``argumentos``; se ele está para ser montado, espera só por ele."""
+        item = self._objetos.get(nome)
+        evento = self._pendentes.get(nome)
+        if evento is not None and (item is None or item[0] != tuple(argumentos[:len(item[0])])):
+            evento.wait(ESPERA_MONTAGEM)
+            item = self._objetos.get(nome)
+        if item is not None and item[0] == tuple(argumentos[:len(item[0])]):
+            return item[1]
+        return None
+
+    def pronto(self):
+        return self._pronto.is_set()
+
+    def estado(self):
+        return {
+            'pronto': self.pronto(),
+            'versao': self.versao,
+            'aquecendo': self._montagem.locked(),
+            'duracao_s': None if self.duracao is None else round(self.duracao, 3),
+            'atualizado_em': self.atualizado_em,
+            'erro': self.erro,
+        }
+
+
+def iniciar(caminho_csv=dados.CAMINHO_CSV, caminho_geojson=CAMINHO_GEOJSON, intervalo=INTERVALO_VERSAO):
+    """Aquecimento do processo, iniciado na primeira chamada; as seguintes só o devolvem.
+
+    Com ``PAINEL_AQUECIMENTO=0`` no ambiente a thread não sobe (o benchmark
+    usa isso para medir só o trabalho do próprio rerun) e os loaders montam
+    tudo sob demanda.
+    """
+    global _instancia
+    with _trava_instancia:
+        if _instancia is None:
+            _instancia = Aquecimento(caminho_csv, caminho_geojson, intervalo)
+            if os.environ.get('PAINEL_AQUECIMENTO') != '0':
+                _instancia.iniciar()
+        return _instancia
+
+
+def preaquecido(nome):
+    """Decorador de loader: devolve o objeto aquecido ``nome`` quando os primeiros
+    argumentos conferem com a chave dele; senão chama o loader."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            objeto = _instancia.obter(nome, args) if _instancia is not None else None
+            return objeto if objeto is not None else funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+class _Prontidao(BaseHTTPRequestHandler):
+    server_version = "PainelProntidao/1"
+
+    def do_GET(self):
+        estado = _instancia.estado() if _instancia is not None else {'pronto': False}
+        if self.path.rstrip('/') == '/saude':
+            status = HTTPStatus.OK
+        elif self.path.rstrip('/') == '/pronto':
+            status = HTTPStatus.OK if estado['pronto'] else HTTPStatus.SERVICE_UNAVAILABLE
+        else:
+            status, estado = HTTPStatus.NOT_FOUND, {'erro': f"Rota desconhecida: {self.path}"}
+        corpo = json.dumps(estado).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        # O balanceador consulta a cada poucos segundos; não polui o log do app
+        pass
+
+
+def servir_prontidao(host='127.0.0.1', porta=PORTA_PRONTIDAO):
+    """Sobe o endpoint de prontidão numa thread; devolve o servidor.
+
+    Por padrão só escuta em 127.0.0.1, porque ``/pronto`` expõe mensagens de
+    erro internas. Se a porta já estiver ocupada, segue sem o endpoint (com um
+    aviso) e devolve None, em vez de derrubar o processo.
+    """
+    try:
+        http = ThreadingHTTPServer((host, porta), _Prontidao)
+    except OSError as erro:
+        if erro.errno != errno.EADDRINUSE:
+            raise
+        print(f"Aviso: porta {porta} ocupada; endpoint de prontidão desligado neste processo.",
+              file=sys.stderr)
+        return None
+    threading.Thread(target=http.serve_forever, name='prontidao', daemon=True).start()
+    return http
@@ -0,0 +1,179 @@
+"""Motor SQL embutido (DuckDB) sobre o quadro consolidado, opcional.
+
+Sem serviço externo e sem cópia: ``dados`` é uma visão DuckDB sobre o
+próprio quadro da versão (o mesmo mapeado do cache em disco e
+compartilhado pelo app), lido no lugar a cada consulta. Cada consulta roda
+num cursor próprio, então sessões diferentes consultam em paralelo.
+
+O cubo (``painel.agregados``) pode delegar ao motor a leitura das colunas
+que usa (só as métricas e a população, só os anos e UFs pedidos) e os
+agregados nacionais por ano, em vez de copiar e agrupar o quadro inteiro
+em pandas.
+
+O painel de SQL do app usa ``consultar``: só uma instrução SELECT por vez,
+sem acesso a arquivos, rede ou extensões, com limite de tempo e de linhas.
+Sem o duckdb instalado, ``disponivel()`` é falso e o painel segue sem o
+motor.
+"""
+import threading
+
+from .dados import CASAS_FLOAT32
+from .medicao import medido
+from .metricas import COLUNA_POPULACAO, SOMA, agregacao
+
+TABELA = 'dados'
+ORIGEM = '_origem'
+LIMITE_LINHAS = 10000
+TEMPO_LIMITE = 10.0  # segundos
+
+# Cada processo do painel tem o seu motor; sem limites, o DuckDB usaria
+# todos os núcleos e até 80% da RAM em cada um deles
+THREADS = 2
+LIMITE_MEMORIA = '256MB'
+
+
+def _duckdb():
+    # Importado só quando o motor é usado; sem duckdb o painel segue só com pandas
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    return duckdb
+
+
+def disponivel():
+    return _duckdb() is not None
+
+
+def _coluna(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+
+class Motor:
+    """Base DuckDB em memória com o quadro de uma versão na visão ``dados``."""
+
+    @medido('consultas.montar')
+    def __init__(self, df):
+        duckdb = _duckdb()
+        if duckdb is None:
+            raise RuntimeError("duckdb não está instalado; o motor SQL não está disponível.")
+        self.versao = df.attrs.get('versao')
+        self.colunas = list(df.columns)
+        self._float32 = {col for col in df.columns if df[col].dtype == 'float32'}
+
+        self._df = df
+        self._con = duckdb.connect(':memory:')
+        self._con.register(ORIGEM, df)
+        self._con.execute(f"CREATE VIEW {TABELA} AS SELECT * FROM {ORIGEM}")
+        self._con.execute(f"SET threads = {THREADS}")
+        self._con.execute(f"SET memory_limit = '{LIMITE_MEMORIA}'")
+        # Daqui em diante nenhuma consulta lê ou grava arquivos, nem muda a configuração
+        self._con.execute("SET enable_external_access = false")
+        self._con.execute("SET lock_configuration = true")
+
+    def _cursor(self):
+        # Objetos registrados valem só na conexão ou cursor em que foram
+        # registrados; a visão os procura no cursor, então cada um registra o
+        # quadro de novo (só a referência, sem cópia)
+        cursor = self._con.cursor()
+        cursor.register(ORIGEM, self._df)
+        return cursor
+
+    def _valor(self, col):
+        # Mesma conversão do cubo: float64, com float32 arredondado às casas preservadas
+        if col in self._float32:
+            return f"ROUND(CAST({_coluna(col)} AS DOUBLE), {CASAS_FLOAT32})"
+        return f"CAST({_coluna(col)} AS DOUBLE)"
+
+    @staticmethod
+    def _filtro(anos=None, ufs=None):
+        condicoes, parametros = [], []
+        if anos is not None:
+            condicoes.append(f"Ano IN ({', '.join('?' * len(anos))})")
+            parametros += [int(ano) for ano in anos]
+        if ufs is not None:
+            condicoes.append(f"CAST(UF AS VARCHAR) IN ({', '.join('?' * len(ufs))})")
+            parametros += [str(uf) for uf in ufs]
+        return (f" WHERE {' AND '.join(condicoes)}" if condicoes else ""), parametros
+
+    @medido('consultas.valores')
+    def valores(self, colunas, anos=None, ufs=None):
+        """(quadro UF, Ano e colunas em float64, pesos) das partições pedidas, como no cubo."""
+        filtro, parametros = self._filtro(anos, ufs)
+        selecao = ', '.join(f"{self._valor(col)} AS {_coluna(col)}" for col in colunas)
+        sql = (f"SELECT CAST(UF AS VARCHAR) AS UF, CAST(Ano AS BIGINT) AS Ano, {selecao}, "
+               f"{self._valor(COLUNA_POPULACAO)} AS _peso FROM {TABELA}{filtro}")
+        with self._cursor() as cursor:
+            valores = cursor.execute(sql, parametros).df()
+        pesos = valores.pop('_peso').to_numpy(dtype=float)
+        return valores, pesos
+
+    @medido('consultas.nacional')
+    def nacional(self, colunas, anos=None):
+        """Agregados nacionais por ano (índice Ano), pela regra de cada métrica.
+
+        Soma para contagens e população; média ponderada pela população para o
+        resto, com a média simples nos anos sem peso (como em
+        ``agregados.agregados_nacionais``).
+        """
+        filtro, parametros = self._filtro(anos)
+        peso = f"COALESCE({self._valor(COLUNA_POPULACAO)}, 0)"
+        expressoes = []
+        for col in colunas:
+            valor = self._valor(col)
+            if agregacao(col) == SOMA:
+                expressoes.append(f"SUM({valor}) AS {_coluna(col)}")
+                continue
+            peso_valido = f"SUM(CASE WHEN {valor} IS NOT NULL THEN {peso} ELSE 0 END)"
+            expressoes.append(
+                f"CASE WHEN {peso_valido} > 0 THEN SUM({valor} * {peso}) / {peso_valido} "
+                f"ELSE AVG({valor}) END AS {_coluna(col)}"
+            )
+        sql = (f"SELECT CAST(Ano AS BIGINT) AS Ano, {', '.join(expressoes)} "
+               f"FROM {TABELA}{filtro} GROUP BY Ano ORDER BY Ano")
+        with self._cursor() as cursor:
+            nacional = cursor.execute(sql, parametros).df().set_index('Ano')
+        return nacional.astype(float)
+
+    def validar(self, sql):
+        """Levanta ValueError se ``sql`` não for exatamente uma instrução SELECT."""
+        duckdb = _duckdb()
+        try:
+            with self._con.cursor() as cursor:
+                instrucoes = cursor.extract_statements(sql)
+        except duckdb.Error as erro:
+            raise ValueError(str(erro)) from erro
+        if len(instrucoes) != 1:
+            raise ValueError("Envie exatamente uma instrução SQL.")
+        if instrucoes[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("Só consultas SELECT (ou WITH ... SELECT) são permitidas.")
+
+    @medido('consultas.consultar')
+    def consultar(self, sql, limite=LIMITE_LINHAS, tempo=TEMPO_LIMITE):
+        """(resultado com até ``limite`` linhas, se foi truncado) de uma consulta SELECT.
+
+        A consulta é interrompida depois de ``tempo`` segundos (TimeoutError).
+        Erros de SQL saem como ValueError, com a mensagem do DuckDB.
+        """
+        self.validar(sql)
+        duckdb = _duckdb()
+        cursor = self._cursor()
+        interromper = threading.Timer(tempo, cursor.interrupt)
+        interromper.start()
+        try:
+            # O limite entra na consulta, para o DuckDB parar de produzir linhas
+            resultado = cursor.sql(sql).limit(limite + 1).df()
+        except duckdb.InterruptException as erro:
+            raise TimeoutError(f"Consulta interrompida depois de {tempo:g} s.") from erro
+        except duckdb.Error as erro:
+            raise ValueError(str(erro)) from erro
+        finally:
+            interromper.cancel()
+            cursor.close()
+        return resultado.head(limite), len(resultado) > limite
+
+    def esquema(self):
+        """Colunas e tipos da visão ``dados``."""
+        with self._cursor() as cursor:
+            esquema = cursor.execute(f"DESCRIBE {TABELA}").df()
+        return esquema[['column_name', 'column_type']].rename(columns={'column_name': 'Coluna', 'column_type': 'Tipo'})
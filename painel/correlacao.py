@@ -0,0 +1,162 @@
+"""Correlações entre métricas e registro de pares para a análise bivariada.
+
+As correlações de Pearson e Spearman entre todas as métricas, para todos
+os anos, ficam num tensor (ano × métrica × métrica) calculado uma vez por
+versão do cubo. Cada coeficiente usa só as UFs que têm os dois valores
+(pairwise-complete, como em ``DataFrame.corr``).
+"""
+import copy
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from .medicao import medido
+from .metricas import NOMES, PARES_BIVARIADOS
+
+
+def _pearson(valores, validos):
+    """Pearson pairwise-complete de (ano, UF, métrica) -> (ano, métrica, métrica)."""
+    # Centraliza cada coluna pela própria média (não muda r e evita cancelamento)
+    n_col = validos.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.where(validos, valores, 0).sum(axis=1, keepdims=True) / n_col
+        x = np.where(validos, valores - media, 0.0)
+    m = validos.astype(float)
+
+    n = np.einsum('aui,auj->aij', m, m)
+    sx = np.einsum('aui,auj->aij', x, m)
+    sy = np.einsum('aui,auj->aij', m, x)
+    sxx = np.einsum('aui,auj->aij', x * x, m)
+    syy = np.einsum('aui,auj->aij', m, x * x)
+    sxy = np.einsum('aui,auj->aij', x, x)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+    r[(n < 2) | (var_x <= 0) | (var_y <= 0)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def _spearman(valores, validos):
+    """Spearman pairwise-complete, agrupando as colunas por padrão de ausência.
+
+    Os postos dependem das linhas válidas do par, então colunas com o mesmo
+    padrão de ausência são ranqueadas juntas. Sem ausências há um único
+    grupo por ano e o cálculo é um só ``corrcoef`` dos postos.
+    """
+    n_anos, _, n_met = valores.shape
+    r = np.full((n_anos, n_met, n_met), np.nan)
+    for a in range(n_anos):
+        padroes = {}
+        for j in range(n_met):
+            padroes.setdefault(validos[a, :, j].tobytes(), []).append(j)
+        grupos = [(validos[a, :, cols[0]], cols) for cols in padroes.values()]
+
+        for (mask_p, cols_p), (mask_q, cols_q) in itertools.combinations_with_replacement(grupos, 2):
+            linhas = mask_p & mask_q
+            if linhas.sum() < 2:
+                continue
+            cols = list(dict.fromkeys(cols_p + cols_q))
+            postos = pd.DataFrame(valores[a][linhas][:, cols]).rank().to_numpy()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                bloco = np.corrcoef(postos, rowvar=False)
+            bloco = np.atleast_2d(bloco)
+            pos = {c: k for k, c in enumerate(cols)}
+            ip = [pos[c] for c in cols_p]
+            iq = [pos[c] for c in cols_q]
+            r[a][np.ix_(cols_p, cols_q)] = bloco[np.ix_(ip, iq)]
+            r[a][np.ix_(cols_q, cols_p)] = bloco[np.ix_(iq, ip)]
+    return r
+
+
+class Correlacoes:
+    """Tensor de correlações (ano × métrica × métrica) montado a partir do cubo."""
+
+    @medido('correlacoes.montar')
+    def __init__(self, cubo):
+        self.versao = cubo.versao
+        self.colunas = list(cubo.colunas)
+        self._pos_col = {col: i for i, col in enumerate(self.colunas)}
+        self._definir(sorted(cubo.anos), *self._tensores(cubo, sorted(cubo.anos)))
+
+    def _definir(self, anos, pearson, spearman):
+        self.anos = anos
+        self._pos_ano = {ano: i for i, ano in enumerate(anos)}
+        self.pearson = pearson
+        self.spearman = spearman
+
+    def _tensores(self, cubo, anos):
+        # (ano, UF, métrica), com NaN onde a UF não tem o valor naquele ano
+        valores = np.stack([
+            cubo.ano(ano).reindex(cubo.ufs)[self.colunas].to_numpy(dtype=float)
+            for ano in anos
+        ])
+        validos = ~np.isnan(valores)
+        return _pearson(valores, validos), _spearman(valores, validos)
+
+    @medido('correlacoes.atualizar')
+    def atualizado(self, cubo):
+        """Correlações do cubo novo, recalculando só os anos que ele alterou."""
+        if (cubo.versao_anterior != self.versao or cubo.anos_alterados is None
+                or list(cubo.colunas) != self.colunas):
+            return Correlacoes(cubo)
+
+        novo = copy.copy(self)
+        novo.versao = cubo.versao
+        anos = sorted(cubo.anos)
+        pearson = np.full((len(anos),) + self.pearson.shape[1:], np.nan)
+        spearman = np.full_like(pearson, np.nan)
+        for i, ano in enumerate(anos):
+            if ano in self._pos_ano:
+                pearson[i] = self.pearson[self._pos_ano[ano]]
+                spearman[i] = self.spearman[self._pos_ano[ano]]
+        # A lista de UFs pode ter crescido, então os anos alterados são recalculados com ela
+        p_novos, s_novos = self._tensores(cubo, cubo.anos_alterados)
+        for k, ano in enumerate(cubo.anos_alterados):
+            pearson[anos.index(ano)] = p_novos[k]
+            spearman[anos.index(ano)] = s_novos[k]
+        novo._definir(anos, pearson, spearman)
+        return novo
+
+    def coeficiente(self, ano, col_a, col_b, metodo='pearson'):
+        tensor = self.pearson if metodo == 'pearson' else self.spearman
+        return tensor[self._pos_ano[ano], self._pos_col[col_a], self._pos_col[col_b]]
+
+    def matriz(self, ano, metodo='pearson'):
+        """Matriz de correlação do ano como DataFrame (colunas e índice = métricas)."""
+        tensor = self.pearson if metodo == 'pearson' else self.spearman
+        return pd.DataFrame(tensor[self._pos_ano[ano]], index=self.colunas, columns=self.colunas)
+
+
+class RegistroPares:
+    """Pares de métricas montados sob demanda a partir do recorte anual do cubo.
+
+    Qualquer combinação de duas métricas do cubo é aceita; os pares
+    sugeridos de ``PARES_BIVARIADOS`` são só atalhos com nome.
+    """
+
+    def __init__(self, cubo, sugeridos=PARES_BIVARIADOS):
+        self.cubo = cubo
+        self.sugeridos = {
+            nome: par for nome, par in sugeridos.items()
+            if all(col in cubo.colunas for col in par)
+        }
+        self._pares = {}
+
+    def nome(self, col_a, col_b):
+        for nome, par in self.sugeridos.items():
+            if par == (col_a, col_b):
+                return nome
+        return f"{NOMES.get(col_a, col_a)} vs {NOMES.get(col_b, col_b)}"
+
+    def par(self, ano, col_a, col_b):
+        """UF e os dois valores no ano, só para as UFs que têm ambos."""
+        chave = (ano, col_a, col_b)
+        if chave not in self._pares:
+            if col_a not in self.cubo.colunas or col_b not in self.cubo.colunas:
+                raise KeyError(col_a if col_a not in self.cubo.colunas else col_b)
+            self._pares[chave] = self.cubo.ano(ano)[[col_a, col_b]].dropna().reset_index()
+        return self._pares[chave]
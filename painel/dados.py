@@ -0,0 +1,360 @@
+"""Leitura do CSV consolidado e cache colunar em disco.
+
+O CSV é lido e enriquecido (conversões numéricas e taxas por 100 mil
+habitantes) uma única vez por versão do arquivo. O resultado é gravado em
+Arrow IPC sem compressão, que é mapeado em memória nas cargas seguintes.
+O cache vale enquanto a impressão digital do CSV (tamanho, mtime e
+sha256) não mudar.
+
+O arquivo é publicado uma vez por máquina e compartilhado por todos os
+processos do painel: cada um mapeia o mesmo arquivo, e as colunas sem
+máscara de nulos (UF, Ano e as métricas em ponto flutuante, que guardam
+ausentes como NaN) ficam apoiadas direto nas páginas mapeadas, sem cópia
+por processo. Só as contagens (inteiros anuláveis) são copiadas. Uma
+trava de arquivo garante que só um processo reconstrói o cache; os demais
+esperam e mapeiam o resultado. Ingestões incrementais (``painel.ingestao``) publicam
+novas versões sobre essa mesma base; regenerar o CSV as substitui.
+
+Para gerar o cache antes de subir o servidor:
+
+    python -m painel.dados [caminho_do_csv]
+"""
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from .medicao import medido
+from .metricas import COLUNA_POPULACAO, POR_100K, REGISTRO, SOMA
+
+
+def _pyarrow():
+    # Importado só quando o cache é usado; sem pyarrow o cache em disco fica desligado
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        return None
+    return pa
+
+CAMINHO_CSV = "dados_consolidados_corrigido.csv"
+DIR_CACHE = ".cache"
+
+# Vai no manifesto e no nome do arquivo Arrow; manifesto de outro número é
+# ignorado e o CSV é reprocessado (5: floats sem máscara de nulos, lidos sem cópia)
+VERSAO_PROCESSAMENTO = 5
+
+# Casas decimais que o float32 precisa preservar para ser usado numa coluna
+CASAS_FLOAT32 = 3
+
+
+def ler_csv(caminho=CAMINHO_CSV):
+    return pd.read_csv(caminho, sep=',', decimal='.')
+
+
+def processar(df):
+    """Converte as colunas de origem e calcula as colunas derivadas do registro."""
+    df[COLUNA_POPULACAO] = pd.to_numeric(df[COLUNA_POPULACAO], errors='coerce')
+    df = df.dropna(subset=[COLUNA_POPULACAO]).copy()
+
+    origens = [col for col in dict.fromkeys(m.origem for m in REGISTRO)
+               if col in df.columns and col != COLUNA_POPULACAO]
+    for col in origens:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Todas as taxas por 100 mil numa única operação sobre a matriz das origens
+    derivadas = [m for m in REGISTRO if m.formula == POR_100K and m.origem in df.columns]
+    if derivadas:
+        matriz = df[[m.origem for m in derivadas]].to_numpy(dtype=float)
+        matriz[~np.isfinite(matriz)] = np.nan
+        pop_100k = df[COLUNA_POPULACAO].to_numpy(dtype=float)[:, None] / 100000
+        with np.errstate(divide='ignore', invalid='ignore'):
+            taxas = np.round(matriz / pop_100k, 2)
+        # População zerada não gera taxa (evita infinitos nos gráficos e médias)
+        taxas[~np.isfinite(taxas)] = np.nan
+        df = df.assign(**{m.coluna: taxas[:, i] for i, m in enumerate(derivadas)})
+    return compactar(df)
+
+
+def _colunas_contagem():
+    contagens = {COLUNA_POPULACAO}
+    for m in REGISTRO:
+        if m.formula == POR_100K:
+            contagens.add(m.origem)
+        if m.agregacao == SOMA and m.formula != POR_100K:
+            contagens.add(m.coluna)
+    return contagens
+
+
+def _inteiro_compacto(serie):
+    valores = serie.to_numpy(dtype=float, na_value=np.nan)
+    finitos = valores[np.isfinite(valores)]
+    if len(finitos) and (np.any(finitos != np.round(finitos)) or np.abs(finitos).max() > np.iinfo(np.int32).max):
+        return None
+    return serie.astype('Int32')
+
+
+def _float_compacto(serie):
+    valores = serie.to_numpy(dtype=float, na_value=np.nan)
+    reduzido = valores.astype(np.float32)
+    if np.array_equal(np.round(reduzido.astype(float), CASAS_FLOAT32), np.round(valores, CASAS_FLOAT32), equal_nan=True):
+        return pd.Series(reduzido, index=serie.index)
+    return serie.astype('float64')
+
+
+def compactar(df):
+    """Tipos compactos para o quadro em memória e no cache.
+
+    UF vira categórica, Ano int16, contagens inteiros anuláveis (Int32) e as
+    demais métricas float32 quando isso preserva ``CASAS_FLOAT32`` casas
+    decimais (senão ficam em float64).
+    """
+    contagens = _colunas_contagem()
+    colunas = {}
+    for col in df.columns:
+        serie = df[col]
+        if col == 'UF':
+            colunas[col] = serie.astype('category')
+        elif col == 'Ano':
+            colunas[col] = serie.astype('int16')
+        elif pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            compacta = _inteiro_compacto(serie) if col in contagens else None
+            colunas[col] = compacta if compacta is not None else _float_compacto(serie)
+        else:
+            colunas[col] = serie
+    return pd.DataFrame(colunas, index=df.index)
+
+
+def colunas_ausentes(df):
+    """Colunas de origem das taxas que não existem no quadro."""
+    return [m.origem for m in REGISTRO if m.formula == POR_100K and m.origem not in df.columns]
+
+
+def impressao_digital(caminho=CAMINHO_CSV, sha256=True):
+    st_csv = os.stat(caminho)
+    digital = {'tamanho': st_csv.st_size, 'mtime_ns': st_csv.st_mtime_ns}
+    if sha256:
+        h = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                h.update(bloco)
+        digital['sha256'] = h.hexdigest()
+    return digital
+
+
+def _caminho_manifesto(dir_cache):
+    return os.path.join(dir_cache, 'dados.json')
+
+
+def _ler_manifesto(dir_cache):
+    try:
+        with open(_caminho_manifesto(dir_cache), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _gravar_atomico(caminho, escrever):
+    # Grava em arquivo temporário e troca de uma vez, para que leitores
+    # concorrentes nunca vejam um arquivo pela metade
+    tmp = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        escrever(tmp)
+        os.replace(tmp, caminho)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+@contextlib.contextmanager
+def trava_cache(dir_cache=DIR_CACHE, nome='dados'):
+    """Trava exclusiva entre processos da máquina para (re)construir um artefato do cache."""
+    os.makedirs(dir_cache, exist_ok=True)
+    with open(os.path.join(dir_cache, f".{nome}.trava"), 'w') as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _gravar_arrow(df, caminho):
+    pa = _pyarrow()
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    # Ausentes em ponto flutuante ficam como NaN, sem máscara de nulos: assim
+    # a leitura devolve essas colunas apoiadas no arquivo mapeado, sem cópia
+    for i, campo in enumerate(tabela.schema):
+        if pa.types.is_floating(campo.type):
+            tabela = tabela.set_column(i, campo, pa.array(df[campo.name].to_numpy(), type=campo.type,
+                                                          from_pandas=False))
+    # Um único lote por coluna: vários lotes obrigariam a concatenar (copiar) na leitura
+    tabela = tabela.combine_chunks()
+
+    def escrever(tmp):
+        with pa.OSFile(tmp, 'wb') as sink:
+            with pa.ipc.new_file(sink, tabela.schema) as writer:
+                writer.write_table(tabela)
+
+    _gravar_atomico(caminho, escrever)
+
+
+def _ler_arrow(caminho):
+    pa = _pyarrow()
+    with pa.memory_map(caminho, 'r') as fonte:
+        tabela = pa.ipc.open_file(fonte).read_all()
+    # split_blocks evita consolidar as colunas num bloco único (uma cópia a menos);
+    # colunas sem máscara de nulos ficam apoiadas direto no arquivo mapeado,
+    # compartilhado (somente leitura) por todos os processos da máquina
+    return tabela.to_pandas(split_blocks=True)
+
+
+def _gravar_manifesto(dir_cache, manifesto):
+    def escrever(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f)
+
+    _gravar_atomico(_caminho_manifesto(dir_cache), escrever)
+
+
+def versao_em_cache(caminho_csv=CAMINHO_CSV, dir_cache=DIR_CACHE, travado=False):
+    """Manifesto do cache válido para o CSV atual, ou None se estiver obsoleto.
+
+    ``travado`` indica que quem chama já segura ``trava_cache`` (a trava não é
+    reentrante); sem ela, a regravação do manifesto toma a trava antes.
+    """
+    manifesto = _ler_manifesto(dir_cache)
+    if (manifesto is None or manifesto.get('processamento') != VERSAO_PROCESSAMENTO
+            or not os.path.exists(os.path.join(dir_cache, manifesto['arquivo']))):
+        return None
+
+    digital = impressao_digital(caminho_csv, sha256=False)
+    if (digital['tamanho'], digital['mtime_ns']) == (manifesto['tamanho'], manifesto['mtime_ns']):
+        return manifesto
+
+    # Tamanho/mtime mudaram (ex.: checkout novo), mas o conteúdo pode ser o mesmo
+    digital = impressao_digital(caminho_csv)
+    if digital['sha256'] != manifesto['sha256']:
+        return None
+    if not travado:
+        # Sob a trava e relendo o manifesto: uma ingestão publicada enquanto
+        # isso não é desfeita pela regravação de um manifesto já substituído
+        with trava_cache(dir_cache):
+            return versao_em_cache(caminho_csv, dir_cache, travado=True)
+    manifesto.update(digital)
+    _gravar_manifesto(dir_cache, manifesto)
+    return manifesto
+
+
+def publicar(df, digital, versao, dir_cache=DIR_CACHE, versao_anterior=None, particoes=None):
+    """Grava o quadro processado como nova versão do cache e troca o manifesto.
+
+    ``particoes`` lista os pares [UF, Ano] que mudaram em relação a
+    ``versao_anterior``; com isso os caches derivados podem ser atualizados
+    só nessas partições em vez de remontados do zero.
+    """
+    os.makedirs(dir_cache, exist_ok=True)
+    arquivo = f"dados_{versao[:16]}_v{VERSAO_PROCESSAMENTO}.arrow"
+    _gravar_arrow(df, os.path.join(dir_cache, arquivo))
+
+    manifesto = dict(
+        digital, arquivo=arquivo, processamento=VERSAO_PROCESSAMENTO,
+        versao=versao, versao_anterior=versao_anterior, particoes=particoes,
+    )
+    antigo = _ler_manifesto(dir_cache)
+    _gravar_manifesto(dir_cache, manifesto)
+
+    # A versão anterior fica: um processo que leu o manifesto antigo logo
+    # antes da troca ainda vai abrir o arquivo dela. Saem só as mais antigas
+    _podar(dir_cache, {arquivo, antigo.get('arquivo') if antigo else None})
+    return manifesto
+
+
+def _podar(dir_cache, manter):
+    """Remove do cache os arquivos de versões do quadro fora de ``manter``."""
+    for caminho in glob.glob(os.path.join(dir_cache, 'dados_*.arrow')):
+        if os.path.basename(caminho) not in manter:
+            try:
+                os.remove(caminho)  # quem já mapeou o arquivo segue lendo
+            except OSError:
+                pass
+
+
+@medido('dados.construir_cache')
+def construir_cache(caminho_csv=CAMINHO_CSV, dir_cache=DIR_CACHE):
+    """Lê e processa o CSV e grava o resultado em Arrow IPC. Retorna o manifesto."""
+    if _pyarrow() is None:
+        raise RuntimeError("pyarrow não está instalado; o cache colunar não está disponível.")
+
+    digital = impressao_digital(caminho_csv)
+    df = processar(ler_csv(caminho_csv))
+    return publicar(df, digital, digital['sha256'], dir_cache)
+
+
+def manifesto_atual(caminho_csv=CAMINHO_CSV, dir_cache=DIR_CACHE):
+    """Manifesto da versão atual, reconstruindo o cache se o CSV mudou."""
+    manifesto = versao_em_cache(caminho_csv, dir_cache)
+    if manifesto is None:
+        # Só um processo reconstrói; quem esperou na trava encontra o cache pronto
+        with trava_cache(dir_cache):
+            manifesto = versao_em_cache(caminho_csv, dir_cache, travado=True)
+            if manifesto is None:
+                manifesto = construir_cache(caminho_csv, dir_cache)
+    return manifesto
+
+
+def versao_atual(caminho_csv=CAMINHO_CSV, dir_cache=DIR_CACHE):
+    """Identificador da versão dos dados; muda a cada reconstrução ou ingestão.
+
+    É barato (um stat do CSV e a leitura do manifesto) e pode ser chamado a
+    cada rerun para perceber versões novas publicadas por outro processo.
+    """
+    if _pyarrow() is None:
+        return _versao_sem_cache(caminho_csv)
+    return manifesto_atual(caminho_csv, dir_cache)['versao']
+
+
+def _versao_sem_cache(caminho_csv):
+    # Sem pyarrow não há manifesto: a versão vem do stat do CSV, tanto em
+    # versao_atual quanto no quadro lido por carregar, para que as duas confiram
+    digital = impressao_digital(caminho_csv, sha256=False)
+    return f"{digital['tamanho']}-{digital['mtime_ns']}"
+
+
+@medido('dados.ler_arrow')
+def ler_versao(manifesto, dir_cache=DIR_CACHE):
+    """Quadro da versão descrita pelo manifesto, com a versão em ``df.attrs``."""
+    df = _ler_arrow(os.path.join(dir_cache, manifesto['arquivo']))
+    # A versão acompanha o quadro para chavear os caches derivados dele
+    df.attrs['versao'] = manifesto['versao']
+    df.attrs['versao_anterior'] = manifesto.get('versao_anterior')
+    df.attrs['particoes'] = manifesto.get('particoes')
+    return df
+
+
+def carregar(caminho_csv=CAMINHO_CSV, dir_cache=DIR_CACHE):
+    """DataFrame processado, vindo do cache em disco sempre que possível."""
+    if _pyarrow() is None:
+        # Versão tomada antes da leitura: se o CSV mudar no meio, o próximo rerun percebe
+        versao = _versao_sem_cache(caminho_csv)
+        df = processar(ler_csv(caminho_csv))
+        df.attrs['versao'] = versao
+        return df
+    return ler_versao(manifesto_atual(caminho_csv, dir_cache), dir_cache)
+
+
+if __name__ == "__main__":
+    caminho = sys.argv[1] if len(sys.argv) > 1 else CAMINHO_CSV
+    manifesto = construir_cache(caminho)
+    print(f"Cache gravado em {os.path.join(DIR_CACHE, manifesto['arquivo'])} (sha256 {manifesto['sha256'][:12]})")
@@ -0,0 +1,108 @@
+"""Cache das especificações de figuras, compartilhado entre as sessões.
+
+Montar uma figura do Plotly Express ou do Altair custa bem mais do que
+reaproveitar uma pronta. As figuras são chaveadas pela versão dos dados e
+pelas entradas da seção (por exemplo ``(versao, 'mapa', 'choropleth',
+ano, coluna)``).
+
+As do Plotly ficam guardadas como objeto ``go.Figure``: o
+``st.plotly_chart`` reconstrói e revalida a figura quando recebe JSON ou
+dict, mas com o objeto pronto só o reserializa. O mesmo objeto é
+entregue a todas as sessões e deve ser tratado como somente leitura. As
+especificações Vega-Lite ficam em JSON, e cada acerto devolve uma cópia
+nova (reler o JSON é barato).
+
+O espaço é limitado por um orçamento em bytes (tamanho do JSON de cada
+figura); quando ele estoura, saem as figuras usadas há mais tempo (LRU).
+"""
+import json
+import threading
+from collections import OrderedDict
+
+PLOTLY = 'plotly'
+VEGA_LITE = 'vega_lite'
+
+ORCAMENTO_BYTES = 64 * 2**20
+
+
+def serializar(figura):
+    """(tipo, JSON) de uma figura do Plotly ou de um gráfico do Altair."""
+    if hasattr(figura, 'to_plotly_json'):
+        return PLOTLY, figura.to_json()
+
+    import altair as alt
+
+    # Dados embutidos na especificação, sem o limite de linhas do Altair, e sem
+    # as larguras e alturas do tema padrão (como faz o st.altair_chart)
+    with alt.themes.enable('none'), alt.data_transformers.enable('default', max_rows=None):
+        return VEGA_LITE, json.dumps(figura.to_dict(), separators=(',', ':'))
+
+
+def _item(figura):
+    # (tipo, o que fica guardado, bytes do JSON): o objeto, no Plotly; o JSON, no Vega-Lite
+    tipo, texto = serializar(figura)
+    return tipo, (figura if tipo == PLOTLY else texto), len(texto)
+
+
+def _entregar(tipo, guardado):
+    # Figura pronta para ``st.plotly_chart`` ou especificação para ``st.vega_lite_chart``
+    return guardado if tipo == PLOTLY else json.loads(guardado)
+
+
+class CacheFiguras:
+    """Figuras prontas com despejo LRU por orçamento de bytes."""
+
+    def __init__(self, orcamento_bytes=ORCAMENTO_BYTES):
+        self.orcamento_bytes = orcamento_bytes
+        self._itens = OrderedDict()
+        self._bytes = 0
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave, construir):
+        """(tipo, figura, bytes) da chave, chamando ``construir()`` só se faltar."""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+            else:
+                self.falhas += 1
+        if item is None:
+            # Construída fora da trava: sessões com chaves diferentes não esperam
+            item = _item(construir())
+            self._guardar(chave, item)
+        tipo, guardado, tamanho = item
+        return tipo, _entregar(tipo, guardado), tamanho
+
+    def aquecer(self, chave, construir):
+        """Guarda a figura da chave se ainda faltar, sem contar acerto/falha."""
+        with self._trava:
+            if chave in self._itens:
+                return
+        self._guardar(chave, _item(construir()))
+
+    def _guardar(self, chave, item):
+        tamanho = item[2]
+        if tamanho > self.orcamento_bytes:
+            return
+        with self._trava:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self._bytes -= antigo[2]
+            self._itens[chave] = item
+            self._bytes += tamanho
+            while self._bytes > self.orcamento_bytes:
+                _, despejado = self._itens.popitem(last=False)
+                self._bytes -= despejado[2]
+
+    def estatisticas(self):
+        with self._trava:
+            return {'itens': len(self._itens), 'bytes': self._bytes,
+                    'acertos': self.acertos, 'falhas': self.falhas}
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self._bytes = 0
@@ -0,0 +1,286 @@
+"""Geometria das UFs para o mapa coroplético.
+
+O GeoJSON é lido uma vez e simplificado em alguns níveis de tolerância.
+A simplificação preserva a topologia: as fronteiras compartilhadas entre
+dois estados são cortadas em arcos entre os pontos de junção, e cada arco
+é simplificado uma única vez. Assim os dois vizinhos recebem exatamente os
+mesmos vértices e não surgem buracos nem sobreposições. As coordenadas de
+saída são quantizadas (arredondadas) para reduzir o tamanho do JSON
+enviado ao navegador dentro de cada figura.
+
+``carregar`` publica os níveis simplificados no cache em disco, um arquivo
+por nível, uma vez por máquina e por conteúdo do GeoJSON (sha256): os
+outros processos do painel leem só os níveis que desenham em vez de ler e
+simplificar o original.
+"""
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from . import dados
+from .medicao import medido
+
+# nível -> (tolerância em graus, casas decimais das coordenadas)
+NIVEIS = {
+    'original': (0.0, 6),
+    'alta': (0.005, 4),
+    'media': (0.02, 3),
+    'baixa': (0.06, 2),
+}
+
+# Nível usado pelo mapa do painel (zoom 3 cobre ~0,17° por pixel)
+NIVEL_MAPA = 'media'
+
+# Sufixo dos níveis publicados (geometria_<sha256>_<nível>_v1.json): com outro número
+# o GeoJSON é simplificado de novo e o arquivo anterior sai do cache
+VERSAO_GEOMETRIA = 1
+
+# Grade usada para identificar vértices iguais em polígonos vizinhos
+_ESCALA_CHAVE = 10 ** 6
+
+
+def _aneis(geometria):
+    if geometria['type'] == 'Polygon':
+        return [geometria['coordinates']]
+    if geometria['type'] == 'MultiPolygon':
+        return geometria['coordinates']
+    return []
+
+
+def _douglas_peucker(pontos, tolerancia):
+    """Máscara dos pontos mantidos pela simplificação de Douglas-Peucker."""
+    n = len(pontos)
+    manter = np.zeros(n, dtype=bool)
+    manter[0] = manter[-1] = True
+    if n <= 2 or tolerancia <= 0:
+        manter[:] = True
+        return manter
+
+    pilha = [(0, n - 1)]
+    while pilha:
+        i, j = pilha.pop()
+        if j - i < 2:
+            continue
+        a, b = pontos[i], pontos[j]
+        meio = pontos[i + 1:j]
+        ab = b - a
+        comprimento = np.hypot(ab[0], ab[1])
+        if comprimento == 0:
+            dist = np.hypot(meio[:, 0] - a[0], meio[:, 1] - a[1])
+        else:
+            dist = np.abs(ab[0] * (meio[:, 1] - a[1]) - ab[1] * (meio[:, 0] - a[0])) / comprimento
+        k = int(np.argmax(dist))
+        if dist[k] > tolerancia:
+            k += i + 1
+            manter[k] = True
+            pilha.append((i, k))
+            pilha.append((k, j))
+    return manter
+
+
+class Geometria:
+    """GeoJSON das UFs com versões simplificadas pré-calculadas por nível."""
+
+    @medido('geo.simplificar')
+    def __init__(self, geojson, niveis=NIVEIS):
+        self.original = geojson
+        features = geojson.get('features', [])
+
+        # Anéis abertos (sem repetir o primeiro ponto) com chaves inteiras por vértice
+        self._aneis = []
+        for feature in features:
+            poligonos = []
+            for poligono in _aneis(feature.get('geometry') or {}):
+                aneis = []
+                for anel in poligono:
+                    pontos = np.asarray(anel, dtype=float)[:, :2]
+                    if len(pontos) > 1 and np.array_equal(pontos[0], pontos[-1]):
+                        pontos = pontos[:-1]
+                    chaves = [tuple(c) for c in np.round(pontos * _ESCALA_CHAVE).astype(np.int64)]
+                    aneis.append((pontos, chaves))
+                poligonos.append(aneis)
+            self._aneis.append(poligonos)
+
+        juncoes = self._juncoes()
+        self._niveis = {
+            nome: self._montar(features, juncoes, tolerancia, casas)
+            for nome, (tolerancia, casas) in niveis.items()
+        }
+
+    def _juncoes(self):
+        # Um vértice é junção quando o conjunto de anéis que passa por ele muda
+        # em relação ao vértice anterior ou seguinte, ou quando 3+ anéis se tocam
+        donos = {}
+        id_anel = 0
+        for poligonos in self._aneis:
+            for aneis in poligonos:
+                for _, chaves in aneis:
+                    for chave in chaves:
+                        donos.setdefault(chave, set()).add(id_anel)
+                    id_anel += 1
+
+        juncoes = set()
+        for poligonos in self._aneis:
+            for aneis in poligonos:
+                for _, chaves in aneis:
+                    n = len(chaves)
+                    for i, chave in enumerate(chaves):
+                        atual = donos[chave]
+                        if (len(atual) > 2 or atual != donos[chaves[i - 1]]
+                                or atual != donos[chaves[(i + 1) % n]]):
+                            juncoes.add(chave)
+        return juncoes
+
+    def _simplificar_anel(self, pontos, chaves, juncoes, tolerancia, arcos):
+        n = len(pontos)
+        if n < 4 or tolerancia <= 0:
+            return pontos
+
+        fixos = [i for i, chave in enumerate(chaves) if chave in juncoes]
+        if not fixos:
+            # Anel isolado (ilha): fixa o primeiro ponto e o mais distante dele
+            distancias = np.hypot(*(pontos - pontos[0]).T)
+            fixos = [0, int(np.argmax(distancias))] if n > 1 else [0]
+
+        manter = np.zeros(n, dtype=bool)
+        for a, b in zip(fixos, fixos[1:] + [fixos[0] + n]):
+            indices = np.arange(a, b + 1) % n
+            arco = tuple(chaves[i] for i in indices)
+            # Arcos compartilhados são percorridos em sentidos opostos pelos
+            # vizinhos; a orientação canônica garante o mesmo resultado
+            invertido = arco[::-1] < arco
+            chave_arco = arco[::-1] if invertido else arco
+            mascara = arcos.get(chave_arco)
+            if mascara is None:
+                seq = pontos[indices[::-1]] if invertido else pontos[indices]
+                mascara = _douglas_peucker(seq, tolerancia)
+                arcos[chave_arco] = mascara
+            if invertido:
+                mascara = mascara[::-1]
+            manter[indices[mascara]] = True
+
+        simplificado = pontos[manter]
+        if len(simplificado) < 3:
+            return pontos
+        return simplificado
+
+    def _montar(self, features, juncoes, tolerancia, casas):
+        arcos = {}
+        saida = []
+        for feature, poligonos in zip(features, self._aneis):
+            coordenadas = []
+            for aneis in poligonos:
+                novos = []
+                for pontos, chaves in aneis:
+                    simplificado = np.round(
+                        self._simplificar_anel(pontos, chaves, juncoes, tolerancia, arcos), casas
+                    )
+                    # Remove repetições consecutivas criadas pelo arredondamento
+                    repetido = np.all(simplificado == np.roll(simplificado, 1, axis=0), axis=1)
+                    simplificado = simplificado[~repetido] if not repetido.all() else simplificado[:1]
+                    if len(simplificado) < 3:
+                        continue
+                    anel = simplificado.tolist()
+                    anel.append(anel[0])
+                    novos.append(anel)
+                if novos:
+                    coordenadas.append(novos)
+
+            if not coordenadas:
+                continue
+            if len(coordenadas) == 1:
+                geometria = {'type': 'Polygon', 'coordinates': coordenadas[0]}
+            else:
+                geometria = {'type': 'MultiPolygon', 'coordinates': coordenadas}
+            # Só o id é usado pelo mapa (featureidkey="id"); as propriedades ficam de fora
+            saida.append({'type': 'Feature', 'id': feature.get('id'), 'geometry': geometria})
+        return {'type': 'FeatureCollection', 'features': saida}
+
+    @classmethod
+    def de_niveis(cls, niveis):
+        """Geometria a partir de níveis já simplificados (sem o GeoJSON original)."""
+        geometria = cls.__new__(cls)
+        geometria.original = None
+        geometria._aneis = None
+        geometria._niveis = niveis
+        return geometria
+
+    def nivel(self, nome=NIVEL_MAPA):
+        return self._niveis[nome]
+
+    def tamanhos(self):
+        """Tamanho em bytes do JSON de cada nível."""
+        return {
+            nome: len(json.dumps(geojson, separators=(',', ':')))
+            for nome, geojson in self._niveis.items()
+        }
+
+
+@medido('geo.ler')
+def carregar_geojson(caminho):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _sha256(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _publicado(dir_cache, sha, nivel):
+    return os.path.join(dir_cache, f"geometria_{sha}_{nivel}_v{VERSAO_GEOMETRIA}.json")
+
+
+def _ler_niveis(dir_cache, sha, niveis):
+    """Níveis publicados pedidos, ou None se algum ainda não existe."""
+    lidos = {}
+    for nivel in niveis:
+        try:
+            with open(_publicado(dir_cache, sha, nivel), 'r', encoding='utf-8') as f:
+                lidos[nivel] = json.load(f)
+        except FileNotFoundError:
+            return None
+    return lidos
+
+
+@medido('geo.carregar')
+def carregar(caminho, dir_cache=dados.DIR_CACHE, niveis=(NIVEL_MAPA,)):
+    """Geometria só com os ``niveis`` pedidos, vindos do cache em disco quando já publicados.
+
+    Os demais níveis (inclusive o original) não ficam na memória do processo.
+    """
+    sha = _sha256(caminho)[:16]
+    lidos = _ler_niveis(dir_cache, sha, niveis)
+    if lidos is not None:
+        return Geometria.de_niveis(lidos)
+
+    with dados.trava_cache(dir_cache, 'geometria'):
+        # Outro processo pode ter publicado enquanto este esperava a trava
+        lidos = _ler_niveis(dir_cache, sha, niveis)
+        if lidos is not None:
+            return Geometria.de_niveis(lidos)
+        geometria = Geometria(carregar_geojson(caminho))
+
+        publicados = set()
+        for nivel, geojson in geometria._niveis.items():
+            def escrever(tmp, geojson=geojson):
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(geojson, f, separators=(',', ':'))
+
+            destino = _publicado(dir_cache, sha, nivel)
+            dados._gravar_atomico(destino, escrever)
+            publicados.add(destino)
+        # Versões anteriores saem do cache (processos que já as leram não dependem do arquivo)
+        for antigo in glob.glob(os.path.join(dir_cache, 'geometria_*.json')):
+            if antigo not in publicados:
+                try:
+                    os.remove(antigo)
+                except OSError:
+                    pass
+    return Geometria.de_niveis({nivel: geometria.nivel(nivel) for nivel in niveis})
@@ -0,0 +1,209 @@
+"""Montagem das figuras do painel (Plotly e Altair), sem dependência do Streamlit.
+
+As mesmas funções servem ao app e aos relatórios estáticos
+(``painel.relatorio``). Plotly e Altair são importados dentro de cada
+função, para não pesar em quem só precisa de parte delas.
+"""
+from .metricas import METRICAS, NOMES, UF_SIGLA
+
+# Estilo do mapa no painel (tiles baixados pelo navegador) e a alternativa
+# sem tiles, que não depende de rede nem de token para desenhar ou exportar
+ESTILO_MAPA = "carto-darkmatter"
+ESTILO_MAPA_OFFLINE = "white-bg"
+
+_CENTRO_BRASIL = {"lat": -14.2350, "lon": -51.9253}
+
+
+def dados_mapa(cubo, ano, coluna):
+    """UF, valor e sigla (NaN quando a UF não tem sigla) das UFs com valor no ano."""
+    df_mapa = cubo.ranking(ano, coluna).rename_axis('UF').reset_index()
+    df_mapa['UF_Sigla'] = df_mapa['UF'].map(UF_SIGLA)
+    return df_mapa
+
+
+def mapa(df_mapa, geojson, coluna, nome, ano, estilo=ESTILO_MAPA):
+    import plotly.express as px
+
+    rotulo = nome.split('(')[0].strip()
+    # Texto da barra de cores claro sobre os tiles escuros, escuro sobre o fundo branco
+    cor_texto = 'white' if estilo == ESTILO_MAPA else '#333'
+    fig_map = px.choropleth_mapbox(df_mapa,
+                               geojson=geojson,
+                               locations='UF_Sigla',
+                               featureidkey="id",
+                               color=coluna,
+                               color_continuous_scale="Blues",
+                               mapbox_style=estilo,
+                               zoom=3, center=_CENTRO_BRASIL,
+                               opacity=0.7,
+                               hover_name='UF',
+                               hover_data={'UF_Sigla': False, coluna: ':.2f'},
+                               title=f"{nome} por UF em {ano}",
+                               labels={coluna: rotulo}
+                              )
+    fig_map.update_layout(
+        margin={"r":0,"t":40,"l":0,"b":0},
+        coloraxis_colorbar=dict(
+            title=dict(
+                text=rotulo,
+                font=dict(color=cor_texto)
+            ),
+            tickfont=dict(color=cor_texto)
+        )
+     )
+    return fig_map
+
+
+def ranking(serie_ranking, coluna, nome, maiores=True):
+    """Barras das 10 UFs com maiores (ou menores) valores da série já ordenada."""
+    import altair as alt
+
+    if maiores:
+        return alt.Chart(serie_ranking.head(10).rename_axis('UF').reset_index()).mark_bar().encode(
+            y=alt.Y('UF:N', sort='-x', title="UF"),
+            x=alt.X(f'{coluna}:Q', title=nome),
+            tooltip=['UF', alt.Tooltip(f'{coluna}:Q', format=".2f")]
+        ).properties(height=300)
+    return alt.Chart(serie_ranking.tail(10).iloc[::-1].rename_axis('UF').reset_index()).mark_bar(color='#5276A7').encode(
+        y=alt.Y('UF:N', sort='x', title="UF"),
+        x=alt.X(f'{coluna}:Q', title=nome),
+        tooltip=['UF', alt.Tooltip(f'{coluna}:Q', format=".2f")]
+    ).properties(height=300)
+
+
+def evolucao(serie, colunas, titulo, eixo='Valor'):
+    """Linhas das métricas ao longo dos anos; ``serie`` tem índice Ano (cubo.uf, cubo.nacional ou painel.series)."""
+    import altair as alt
+
+    df_melted = serie.reset_index().melt(
+        id_vars=['Ano'],
+        value_vars=colunas,
+        var_name='Métrica',
+        value_name='Valor'
+    )
+    df_melted['Métrica'] = df_melted['Métrica'].map(NOMES)
+
+    return alt.Chart(df_melted).mark_line(point=True).encode(
+        x=alt.X('Ano:O', title='Ano'),
+        y=alt.Y('Valor:Q', title=eixo, scale=alt.Scale(zero=False)),
+        color='Métrica:N',
+        tooltip=['Ano', 'Métrica', alt.Tooltip('Valor:Q', format=".2f")]
+    ).properties(
+        title=titulo
+    ).interactive()
+
+
+def comparativo(recorte_ano, ufs, colunas):
+    """Barras agrupadas das métricas para as UFs, na ordem de ``ufs``."""
+    import plotly.express as px
+
+    df_plot = recorte_ano.loc[ufs, colunas].reset_index()
+
+    df_plot_melted = df_plot.melt(
+        id_vars='UF',
+        value_vars=colunas,
+        var_name='Métrica Código',
+        value_name='Valor'
+    )
+    df_plot_melted['Métrica'] = df_plot_melted['Métrica Código'].map(NOMES)
+
+    uf_order = df_plot['UF'].tolist()
+
+    fig_comp = px.bar(
+        df_plot_melted,
+        x='UF',
+        y='Valor',
+        color='Métrica',
+        barmode='group',
+        title=f"Comparativo: {', '.join(NOMES[col] for col in colunas)}",
+        labels={'Valor': 'Valor do Indicador', 'Métrica': 'Indicador'},
+        category_orders={'UF': uf_order}
+    )
+
+    fig_comp.update_layout(
+        xaxis_title="Unidade da Federação",
+        yaxis_title="Valor",
+        legend_title="Métricas",
+        title_font_size=20,
+        xaxis_tickangle=-45
+    )
+    return fig_comp
+
+
+def bivariado(df_par_ano, coluna_metrica_col, linha_metrica_col, ano):
+    """Primeira métrica em colunas (eixo esquerdo) e segunda em linha e pontos (eixo direito)."""
+    import altair as alt
+
+    coluna_metrica_nome = NOMES.get(coluna_metrica_col, coluna_metrica_col)
+    linha_metrica_nome = NOMES.get(linha_metrica_col, linha_metrica_col)
+
+    # Ordenar o DataFrame pela métrica das colunas (decrescente) para definir a ordem no eixo X
+    df_par_ano_sorted = df_par_ano.sort_values(by=coluna_metrica_col, ascending=False)
+    uf_order = df_par_ano_sorted['UF'].tolist()
+
+    # Base chart (define o eixo X e a fonte de dados)
+    base = alt.Chart(df_par_ano_sorted).encode(
+        alt.X('UF:N', sort=uf_order, title='UF') # Ordena o eixo X
+    )
+
+    # Camada das Colunas (eixo Y esquerdo)
+    bars = base.mark_bar().encode(
+        alt.Y(f'{coluna_metrica_col}:Q', title=coluna_metrica_nome, axis=alt.Axis(grid=True)),
+        tooltip=[
+            alt.Tooltip('UF:N', title='UF'),
+            alt.Tooltip(f'{coluna_metrica_col}:Q', format=".2f", title=coluna_metrica_nome)
+        ]
+    )
+
+    line = base.mark_line(color='orange').encode( # Define a cor da LINHA aqui
+        alt.Y(f'{linha_metrica_col}:Q', title=linha_metrica_nome, axis=alt.Axis(grid=False)),
+        tooltip=[
+            alt.Tooltip('UF:N', title='UF'),
+            alt.Tooltip(f'{linha_metrica_col}:Q', format=".2f", title=linha_metrica_nome)
+        ]
+    )
+
+    # Camada separada para os PONTOS (com cor diferente)
+    points = base.mark_point(color='red', size=50, filled=True).encode( # Define a cor e tamanho dos PONTOS aqui
+         alt.Y(f'{linha_metrica_col}:Q'), # Mapeia para o mesmo eixo Y da linha
+         tooltip=[ # Repete o tooltip para os pontos
+            alt.Tooltip('UF:N', title='UF'),
+            alt.Tooltip(f'{linha_metrica_col}:Q', format=".2f", title=linha_metrica_nome)
+        ]
+    )
+
+    # Combinar as camadas: barras, linha e pontos
+    return alt.layer(bars, line, points).resolve_scale(
+        y='independent'
+    ).properties(
+         title=f"{coluna_metrica_nome} (Colunas) vs. {linha_metrica_nome} (Linha/Pontos) por UF - {ano}"
+    ).interactive()
+
+
+def matriz_correlacao(correlacoes, ano, metodo='pearson'):
+    """Mapa de calor da matriz de correlação do ano."""
+    import altair as alt
+
+    ordem = list(METRICAS)
+    df_corr = correlacoes.matriz(ano, metodo).rename(index=NOMES, columns=NOMES)
+    df_corr_melted = df_corr.rename_axis('Indicador A').reset_index().melt(
+        id_vars='Indicador A', var_name='Indicador B', value_name='Correlação'
+    )
+    return alt.Chart(df_corr_melted).mark_rect().encode(
+        x=alt.X('Indicador A:N', sort=ordem, title=None),
+        y=alt.Y('Indicador B:N', sort=ordem, title=None),
+        color=alt.Color('Correlação:Q', scale=alt.Scale(scheme='redblue', domain=[-1, 1])),
+        tooltip=['Indicador A', 'Indicador B', alt.Tooltip('Correlação:Q', format=".3f")]
+    ).properties(height=450)
+
+
+def trajetoria_posicao(trajetoria, uf, nome):
+    """Posição da UF ano a ano (1 no topo), com percentil e valor no tooltip."""
+    import altair as alt
+
+    return alt.Chart(trajetoria.dropna(subset=['Posição']).reset_index()).mark_line(point=True).encode(
+        x=alt.X('Ano:O', title='Ano'),
+        y=alt.Y('Posição:Q', title='Posição', scale=alt.Scale(reverse=True, zero=False), axis=alt.Axis(tickMinStep=1)),
+        tooltip=['Ano', alt.Tooltip('Posição:Q', format=".0f"), alt.Tooltip('Percentil:Q', format=".0f"),
+                 alt.Tooltip('Valor:Q', format=".2f")]
+    ).properties(title=f"Posição de {uf} em {nome}", height=300)
@@ -0,0 +1,73 @@
+"""Ingestão incremental de novas partições (UF, Ano) no conjunto de dados.
+
+Cargas anuais chegam como CSVs pequenos com as mesmas colunas do
+consolidado. Só as linhas novas são convertidas e têm as taxas derivadas
+calculadas; elas substituem (upsert) as partições de mesma UF e Ano na
+versão atual, que é publicada como uma nova versão do cache. O manifesto
+registra as partições alteradas para que o cubo e as correlações sejam
+atualizados só nelas.
+
+    python -m painel.ingestao nova_carga.csv [outra_carga.csv ...]
+"""
+import hashlib
+import sys
+
+import pandas as pd
+
+from . import dados
+
+CHAVE = ['UF', 'Ano']
+
+
+def _hash_quadro(df):
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def ingerir(novos, caminho_csv=dados.CAMINHO_CSV, dir_cache=dados.DIR_CACHE):
+    """Faz upsert das partições de ``novos`` (DataFrame ou caminho de CSV).
+
+    Retorna o manifesto da nova versão (o atual se a carga estiver vazia).
+    """
+    if dados._pyarrow() is None:
+        raise RuntimeError("pyarrow não está instalado; a ingestão incremental depende do cache colunar.")
+
+    if not isinstance(novos, pd.DataFrame):
+        novos = dados.ler_csv(novos)
+    faltando = [col for col in CHAVE + [dados.COLUNA_POPULACAO] if col not in novos.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes na carga: {', '.join(faltando)}")
+
+    # Só o delta passa pela conversão e pelo cálculo das taxas
+    delta = dados.processar(novos.copy()).drop_duplicates(subset=CHAVE, keep='last')
+    if delta.empty:
+        return dados.manifesto_atual(caminho_csv, dir_cache)
+
+    # Leitura, mescla e publicação sob a trava do cache: duas ingestões
+    # simultâneas não partem da mesma versão (uma apagaria o upsert da outra).
+    # A trava não é reentrante, então nada aqui dentro chama manifesto_atual.
+    with dados.trava_cache(dir_cache):
+        manifesto = (dados.versao_em_cache(caminho_csv, dir_cache, travado=True)
+                     or dados.construir_cache(caminho_csv, dir_cache))
+        atual = dados.ler_versao(manifesto, dir_cache)
+
+        chaves_delta = pd.MultiIndex.from_frame(delta[CHAVE])
+        chaves_atual = pd.MultiIndex.from_frame(atual[CHAVE])
+        mantidas = atual[~chaves_atual.isin(chaves_delta)]
+
+        novo = pd.concat([mantidas, delta.reindex(columns=atual.columns.union(delta.columns, sort=False))],
+                         ignore_index=True)
+        novo = dados.compactar(novo.sort_values(CHAVE, kind='stable').reset_index(drop=True))
+
+        versao = hashlib.sha256(f"{manifesto['versao']}:{_hash_quadro(delta)}".encode()).hexdigest()
+        particoes = [[uf, int(ano)] for uf, ano in delta[CHAVE].itertuples(index=False)]
+        digital = {k: manifesto[k] for k in ('tamanho', 'mtime_ns', 'sha256')}
+        return dados.publicar(novo, digital, versao, dir_cache,
+                              versao_anterior=manifesto['versao'], particoes=particoes)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("uso: python -m painel.ingestao nova_carga.csv [outra_carga.csv ...]")
+    for caminho in sys.argv[1:]:
+        manifesto = ingerir(caminho)
+        print(f"{caminho}: versão {manifesto['versao'][:12]} ({len(manifesto.get('particoes') or [])} partições)")
@@ -0,0 +1,141 @@
+"""Gráficos com a troca de ano e métrica feita no navegador.
+
+Os dados de todos os anos vão embutidos uma vez na especificação
+Vega-Lite, e o ano e as métricas são parâmetros ligados a controles do
+próprio gráfico. Trocar de ano ou de métrica nesses gráficos não passa
+pelo servidor: nem rerun do script nem figura nova.
+
+Títulos de eixo do Vega-Lite não aceitam expressões, então o nome da
+métrica escolhida (de ``NOMES``) é calculado em cada linha dos dados e
+usado nas legendas, nas dicas e no título do gráfico, como na versão
+montada no servidor.
+"""
+import json
+
+import altair as alt
+import pandas as pd
+
+from .metricas import NOMES
+
+_VALIDO = "isValid(datum.{0}) && isFinite(datum.{0})"
+
+# Os gráficos mostram duas casas; arredondar antes de embutir encolhe o JSON
+CASAS = 2
+
+COR_COLUNAS = '#4c78a8'
+
+
+def _param_ano(anos, ano):
+    return alt.param(name='ano_sel', value=int(ano),
+                     bind=alt.binding_select(options=[int(a) for a in anos], name='Ano '))
+
+
+def _param_metrica(nome, colunas, inicial, rotulo):
+    return alt.param(name=nome, value=inicial,
+                     bind=alt.binding_select(options=list(colunas),
+                                             labels=[NOMES.get(col, col) for col in colunas],
+                                             name=rotulo))
+
+
+def _nome(param, colunas):
+    # Expressão Vega com o nome da métrica escolhida em ``param``
+    nomes = {col: NOMES.get(col, col) for col in colunas}
+    return f"{json.dumps(nomes, ensure_ascii=False)}[{param.name}]"
+
+
+def _titulo(expressao):
+    return alt.Title(alt.ExprRef(expressao))
+
+
+def ranking(quadro, anos, ano, metrica, colunas):
+    """Maiores e menores valores da métrica no ano, lado a lado."""
+    p_ano = _param_ano(anos, ano)
+    p_metrica = _param_metrica('metrica_sel', colunas, metrica, 'Métrica ')
+
+    base = alt.Chart(quadro.round(CASAS)).transform_filter(
+        alt.datum.Ano == p_ano
+    ).transform_calculate(
+        Valor=f"datum[{p_metrica.name}]", Metrica=_nome(p_metrica, colunas)
+    ).transform_filter(_VALIDO.format('Valor'))
+
+    def barras(ordem, titulo, **marca):
+        return base.transform_window(
+            posicao='row_number()', sort=[alt.SortField('Valor', order=ordem)]
+        ).transform_filter(alt.datum.posicao <= 10).mark_bar(**marca).encode(
+            y=alt.Y('UF:N', sort='-x' if ordem == 'descending' else 'x', title="UF"),
+            x=alt.X('Valor:Q', title=None),
+            tooltip=['UF', alt.Tooltip('Metrica:N', title="Métrica"),
+                     alt.Tooltip('Valor:Q', format=".2f", title="Valor")]
+        ).properties(title=titulo, height=300)
+
+    return alt.hconcat(
+        barras('descending', "Maiores Valores"),
+        barras('ascending', "Menores Valores", color='#5276A7'),
+    ).add_params(p_ano, p_metrica).properties(
+        title=_titulo(f"{_nome(p_metrica, colunas)} + ' - ' + {p_ano.name}")
+    )
+
+
+def evolucao(quadro, nacional, uf, metrica, colunas):
+    """Série da métrica na UF escolhida, junto da série nacional."""
+    nacional = nacional.reset_index().assign(UF="Brasil")
+    dados = pd.concat([quadro, nacional[['UF', 'Ano'] + list(colunas)]], ignore_index=True)
+
+    ufs = ["Brasil"] + sorted(quadro['UF'].unique())
+    p_uf = alt.param(name='uf_sel', value=uf, bind=alt.binding_select(options=ufs, name='UF '))
+    p_metrica = _param_metrica('metrica_sel', colunas, metrica, 'Métrica ')
+
+    return alt.Chart(dados.round(CASAS)).transform_filter(
+        (alt.datum.UF == p_uf) | (alt.datum.UF == "Brasil")
+    ).transform_calculate(
+        Valor=f"datum[{p_metrica.name}]", Metrica=_nome(p_metrica, colunas)
+    ).transform_filter(_VALIDO.format('Valor')).mark_line(point=True).encode(
+        x=alt.X('Ano:O', title='Ano'),
+        y=alt.Y('Valor:Q', title=None, scale=alt.Scale(zero=False)),
+        color=alt.Color('UF:N', title='UF'),
+        tooltip=['Ano', 'UF', alt.Tooltip('Metrica:N', title="Métrica"),
+                 alt.Tooltip('Valor:Q', format=".2f", title="Valor")]
+    ).properties(
+        title=_titulo(f"'Evolução de ' + {_nome(p_metrica, colunas)} + ': UF selecionada e Brasil'")
+    ).add_params(p_uf, p_metrica)
+
+
+def bivariado(quadro, anos, ano, col_colunas, col_linha, colunas):
+    """Colunas (eixo esquerdo) e linha (eixo direito) por UF, com ano e par escolhidos no gráfico."""
+    p_ano = _param_ano(anos, ano)
+    p_colunas = _param_metrica('colunas_sel', colunas, col_colunas, 'Colunas ')
+    p_linha = _param_metrica('linha_sel', colunas, col_linha, 'Linha ')
+
+    base = alt.Chart(quadro.round(CASAS)).transform_filter(
+        alt.datum.Ano == p_ano
+    ).transform_calculate(
+        A=f"datum[{p_colunas.name}]", B=f"datum[{p_linha.name}]",
+        NomeA=_nome(p_colunas, colunas), NomeB=_nome(p_linha, colunas)
+    ).transform_filter(
+        f"{_VALIDO.format('A')} && {_VALIDO.format('B')}"
+    ).encode(
+        alt.X('UF:N', sort=alt.EncodingSortField('A', op='max', order='descending'), title='UF')
+    )
+    tooltip = ['UF', alt.Tooltip('NomeA:N', title="Colunas"), alt.Tooltip('A:Q', format=".2f", title="Valor (colunas)"),
+               alt.Tooltip('NomeB:N', title="Linha"), alt.Tooltip('B:Q', format=".2f", title="Valor (linha)")]
+
+    # O nome de cada métrica aparece na legenda (a cor de cada camada) e no título
+    bars = base.mark_bar().encode(
+        alt.Y('A:Q', title=None, axis=alt.Axis(grid=True, labelColor=COR_COLUNAS)),
+        color=alt.Color('NomeA:N', scale=alt.Scale(range=[COR_COLUNAS]), title="Colunas"),
+        tooltip=tooltip
+    )
+    line = base.mark_line(color='orange').encode(
+        alt.Y('B:Q', title=None, axis=alt.Axis(grid=False, labelColor='orange')),
+        stroke=alt.Stroke('NomeB:N', scale=alt.Scale(range=['orange']), title="Linha"),
+        tooltip=tooltip
+    )
+    points = base.mark_point(color='red', size=50, filled=True).encode(
+        alt.Y('B:Q', title=None), tooltip=tooltip
+    )
+    return alt.layer(bars, line, points).resolve_scale(y='independent').add_params(
+        p_ano, p_colunas, p_linha
+    ).properties(
+        title=_titulo(f"{_nome(p_colunas, colunas)} + ' (colunas) e ' + {_nome(p_linha, colunas)} "
+                      f"+ ' (linha) - ' + {p_ano.name}")
+    )
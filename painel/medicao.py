@@ -0,0 +1,249 @@
+"""Medição leve de tempo, memória, caches e payload por seção do painel.
+
+Desligada por padrão: sem ``PAINEL_MEDICAO=1`` no ambiente (ou ``ativar()``)
+os decoradores e blocos ``medir`` não fazem nada além de uma checagem.
+Quando ligada:
+
+- cada trecho medido gera um registro ``span`` com o nome, a duração em
+  segundos e o pico de memória (o ``tracemalloc`` passa a rastrear as
+  alocações quando a medição é ligada, o que deixa o processo mais lento;
+  o pico é do processo todo, então só é gravado quando nenhum outro
+  trecho, de nenhuma thread, esteve aberto ao mesmo tempo);
+- ``em_cache`` conta chamadas e falhas (misses) das funções em cache;
+- ``registrar_payload`` grava o tamanho serializado de cada figura;
+- com ``PAINEL_MEDICAO_ARQUIVO`` definido, os registros de cada rerun
+  (completo ou só de um fragmento, ver ``fragmento_medido``) são
+  acrescentados a esse arquivo em JSON lines.
+
+Os registros levam o id do rerun em que foram feitos (``iniciar_rerun``),
+para que o painel mostre só os da própria sessão.
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+_ativo = os.environ.get('PAINEL_MEDICAO') == '1'
+ARQUIVO_JSONL = os.environ.get('PAINEL_MEDICAO_ARQUIVO')
+
+_registros = deque(maxlen=20000)
+_contadores = {}
+_trava = threading.Lock()
+_local = threading.local()
+# Trechos mais externos abertos em todas as threads e se algum deles se
+# sobrepôs ao que está medindo memória (protegidos por _trava)
+_abertos = 0
+_sobreposto = False
+
+
+def ativar(ligar=True):
+    global _ativo
+    _ativo = ligar
+    # Sem o tracemalloc rastreando, os trechos medidos não têm pico de memória
+    if ligar and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+if _ativo:
+    ativar()
+
+
+def ativo():
+    return _ativo
+
+
+def _registrar(registro):
+    registro.setdefault('rerun', getattr(_local, 'rerun', None))
+    registro.setdefault('instante', time.time())
+    with _trava:
+        _registros.append(registro)
+
+
+def iniciar_rerun():
+    """Marca o início de um rerun nesta thread e devolve o id dele."""
+    _local.rerun = uuid.uuid4().hex
+    _local.em_rerun = True
+    return _local.rerun
+
+
+@contextmanager
+def medir(nome, **extra):
+    if not _ativo:
+        yield
+        return
+
+    global _abertos, _sobreposto
+    # O pico de memória só é medido no trecho mais externo, porque
+    # reset_peak() num trecho interno apagaria o pico do externo
+    profundidade = getattr(_local, 'profundidade', 0)
+    mede_memoria = False
+    if profundidade == 0:
+        # reset_peak vale para o processo todo: só mede com nenhum outro
+        # trecho aberto (sessões e aquecimento rodam em outras threads)
+        with _trava:
+            if _abertos == 0 and tracemalloc.is_tracing():
+                mede_memoria = True
+                _sobreposto = False
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+            else:
+                _sobreposto = True
+            _abertos += 1
+    _local.profundidade = profundidade + 1
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro = dict(extra, tipo='span', nome=nome, segundos=time.perf_counter() - inicio)
+        _local.profundidade = profundidade
+        if profundidade == 0:
+            with _trava:
+                _abertos -= 1
+                if mede_memoria and not _sobreposto:
+                    registro['pico_bytes'] = tracemalloc.get_traced_memory()[1] - base
+        _registrar(registro)
+
+
+def medido(nome):
+    """Decorador equivalente a envolver a função inteira em ``medir(nome)``."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir(nome):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def fragmento_medido(nome):
+    """``medido`` para a função de um ``st.fragment``.
+
+    Num rerun só do fragmento (fora de um rerun completo do script), o
+    fragmento abre um rerun próprio e grava os registros ao terminar, como
+    o script faz com ``finalizar_rerun`` no fim de um rerun completo.
+    """
+    def decorador(funcao):
+        medida = medido(nome)(funcao)
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if getattr(_local, 'em_rerun', False):
+                return medida(*args, **kwargs)
+            rerun = iniciar_rerun()
+            try:
+                return medida(*args, **kwargs)
+            finally:
+                finalizar_rerun(rerun)
+        return envolvida
+    return decorador
+
+
+def em_cache(nome, cache):
+    """Aplica o decorador de cache ``cache`` contando chamadas e falhas.
+
+    A função interna só roda quando o cache falha; a externa roda sempre.
+    Uso: ``@medicao.em_cache('load_data', st.cache_resource(max_entries=2))``.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def calcular(*args, **kwargs):
+            if _ativo:
+                _contar(nome, 'falhas')
+            return funcao(*args, **kwargs)
+
+        cacheada = cache(calcular)
+
+        @functools.wraps(funcao)
+        def chamar(*args, **kwargs):
+            if not _ativo:
+                return cacheada(*args, **kwargs)
+            _contar(nome, 'chamadas')
+            with medir(f"cache.{nome}"):
+                return cacheada(*args, **kwargs)
+
+        chamar.clear = cacheada.clear
+        return chamar
+    return decorador
+
+
+def _contar(nome, campo):
+    with _trava:
+        contador = _contadores.setdefault(nome, {'chamadas': 0, 'falhas': 0})
+        contador[campo] += 1
+
+
+def contadores_cache():
+    """Chamadas, falhas e acertos de cada cache desde o início do processo."""
+    with _trava:
+        return {
+            nome: dict(c, acertos=c['chamadas'] - c['falhas'])
+            for nome, c in _contadores.items()
+        }
+
+
+def registrar_payload(secao, nome, tamanho):
+    """Grava o tamanho em bytes da especificação de uma figura enviada ao navegador."""
+    if _ativo:
+        _registrar({'tipo': 'payload', 'secao': secao, 'nome': nome, 'bytes': tamanho})
+
+
+@contextmanager
+def perfilado(ligar=True, linhas=40):
+    """Perfila (cProfile) o bloco se ``ligar``; o relatório (tempo acumulado)
+    fica em ``resultado['texto']`` do dicionário devolvido.
+
+    O perfilador é desligado mesmo se o bloco for interrompido (por exemplo
+    pelas exceções de rerun e parada do Streamlit).
+    """
+    resultado = {}
+    if not ligar:
+        yield resultado
+        return
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield resultado
+    finally:
+        perfil.disable()
+        saida = io.StringIO()
+        pstats.Stats(perfil, stream=saida).sort_stats('cumulative').print_stats(linhas)
+        resultado['texto'] = saida.getvalue()
+
+
+def do_rerun(rerun):
+    """Registros feitos no rerun ``rerun`` (sem removê-los)."""
+    with _trava:
+        return [r for r in _registros if r.get('rerun') == rerun]
+
+
+def como_jsonl(registros):
+    return ''.join(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in registros)
+
+
+def finalizar_rerun(rerun):
+    """Encerra o rerun nesta thread e acrescenta os registros dele ao
+    ``PAINEL_MEDICAO_ARQUIVO``, se definido."""
+    _local.em_rerun = False
+    if not _ativo or not ARQUIVO_JSONL:
+        return
+    registros = do_rerun(rerun)
+    registros.append({'tipo': 'caches', 'rerun': rerun, 'instante': time.time(),
+                      'caches': contadores_cache()})
+    with _trava, open(ARQUIVO_JSONL, 'a', encoding='utf-8') as f:
+        f.write(como_jsonl(registros))
+
+
+def coletar():
+    """Devolve e limpa os registros acumulados."""
+    with _trava:
+        registros = list(_registros)
+        _registros.clear()
+    return registros
@@ -0,0 +1,84 @@
+"""Registro de métricas, siglas das UFs e pares da análise bivariada.
+
+Cada métrica declara a coluna de origem no CSV, a unidade, a fórmula que
+gera a coluna exibida e a regra de agregação nacional. As listas usadas
+pelo painel (``METRICAS``, ``NOMES``) e as colunas derivadas são todas
+tiradas daqui, para que não divirjam.
+"""
+from dataclasses import dataclass
+
+# Fórmulas
+ABSOLUTA = 'absoluta'          # valor da origem, sem transformação
+PERCENTUAL = 'percentual'      # valor da origem, já em %
+POR_100K = 'por_100k'          # origem / população * 100 000
+
+# Regras de agregação nacional
+SOMA = 'soma'
+MEDIA_PONDERADA = 'media_ponderada'  # média ponderada pela população
+
+COLUNA_POPULACAO = 'Populacao_total'
+
+
+@dataclass(frozen=True)
+class Metrica:
+    nome: str
+    coluna: str
+    origem: str
+    unidade: str
+    formula: str = ABSOLUTA
+    agregacao: str = MEDIA_PONDERADA
+
+
+REGISTRO = [
+    Metrica('Taxa de Desemprego (%)', 'taxa_desemprego_media', 'taxa_desemprego_media', '%', PERCENTUAL),
+    Metrica('Renda Média Anual', 'renda_media_anual', 'renda_media_anual', 'R$'),
+    Metrica('População Total', COLUNA_POPULACAO, COLUNA_POPULACAO, 'hab.', agregacao=SOMA),
+    Metrica('Taxa de Escolarização (Fundamental %)', 'perc_esc_fundamental', 'perc_esc_fundamental', '%', PERCENTUAL),
+    Metrica('Taxa de Escolarização (Médio %)', 'perc_esc_medio', 'perc_esc_medio', '%', PERCENTUAL),
+    Metrica('Homicídios (por 100k hab.)', 'homicidios_por_100k', 'num_homicidios', 'por 100 mil hab.', POR_100K),
+    Metrica('Suicídios (por 100k hab.)', 'obitos_suicidio_por_100k', 'num_obitos_suicidio', 'por 100 mil hab.', POR_100K),
+    Metrica('Internações Cardio (por 100k hab.)', 'internacoes_cardio_por_100k', 'num_internacoes_cardio', 'por 100 mil hab.', POR_100K),
+    Metrica('Mortes Cardio (por 100k hab.)', 'mortes_cardio_por_100k', 'num_mortes_cardio', 'por 100 mil hab.', POR_100K),
+    Metrica('Óbitos Transporte (por 100k hab.)', 'obitos_transporte_por_100k', 'num_obitos_transporte', 'por 100 mil hab.', POR_100K),
+    Metrica('Homicídios (Absoluto)', 'num_homicidios', 'num_homicidios', 'óbitos', agregacao=SOMA),
+    Metrica('Homicídios Arma de Fogo (Absoluto)', 'num_homicidios_arma', 'num_homicidios_arma', 'óbitos', agregacao=SOMA),
+]
+
+POR_COLUNA = {m.coluna: m for m in REGISTRO}
+
+# Nome exibido -> coluna do quadro
+METRICAS = {m.nome: m.coluna for m in REGISTRO}
+
+# Coluna -> nome exibido
+NOMES = {m.coluna: m.nome for m in REGISTRO}
+
+
+def agregacao(coluna):
+    """Regra de agregação nacional da coluna (média ponderada se não registrada)."""
+    metrica = POR_COLUNA.get(coluna)
+    return metrica.agregacao if metrica else MEDIA_PONDERADA
+
+
+UF_SIGLA = {
+    'Acre': 'AC', 'Alagoas': 'AL', 'Amapá': 'AP', 'Amazonas': 'AM',
+    'Bahia': 'BA', 'Ceará': 'CE', 'Distrito Federal': 'DF', 'Espírito Santo': 'ES',
+    'Goiás': 'GO', 'Maranhão': 'MA', 'Mato Grosso': 'MT', 'Mato Grosso do Sul': 'MS',
+    'Minas Gerais': 'MG', 'Pará': 'PA', 'Paraíba': 'PB', 'Paraná': 'PR',
+    'Pernambuco': 'PE', 'Piauí': 'PI', 'Rio de Janeiro': 'RJ', 'Rio Grande do Norte': 'RN',
+    'Rio Grande do Sul': 'RS', 'Rondônia': 'RO', 'Roraima': 'RR', 'Santa Catarina': 'SC',
+    'São Paulo': 'SP', 'Sergipe': 'SE', 'Tocantins': 'TO'
+}
+
+# Pares da análise bivariada: a primeira coluna vira barras, a segunda linha
+PARES_BIVARIADOS = {
+    'Renda Média vs Mortes Cardio (100k)': ('renda_media_anual', 'mortes_cardio_por_100k'),
+    'Renda Média vs Internações Cardio (100k)': ('renda_media_anual', 'internacoes_cardio_por_100k'),
+    'Escolaridade Média (%) vs Mortes Cardio (100k)': ('perc_esc_medio', 'mortes_cardio_por_100k'),
+    'Escolaridade Média (%) vs Internações Cardio (100k)': ('perc_esc_medio', 'internacoes_cardio_por_100k'),
+    'Escolaridade Fundamental (%) vs Mortes Cardio (100k)': ('perc_esc_fundamental', 'mortes_cardio_por_100k'),
+    'Escolaridade Fundamental (%) vs Internações Cardio (100k)': ('perc_esc_fundamental', 'internacoes_cardio_por_100k'),
+    'Suicídios (100k) vs Mortes Cardio (100k)': ('obitos_suicidio_por_100k', 'mortes_cardio_por_100k'),
+    'Suicídios (100k) vs Internações Cardio (100k)': ('obitos_suicidio_por_100k', 'internacoes_cardio_por_100k'),
+    'Renda Média vs Homicídios (100k)': ('renda_media_anual', 'homicidios_por_100k'),
+    'Renda Média vs Desemprego (%)': ('renda_media_anual', 'taxa_desemprego_media'),
+}
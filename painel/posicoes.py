@@ -0,0 +1,84 @@
+"""Índice de posições das UFs em cada (ano, métrica).
+
+As posições (rank denso, 1 = maior valor), os percentis e a variação de
+posição em relação ao ano anterior de todas as UFs ficam num tensor
+(ano × UF × métrica) montado uma vez por versão do cubo. A ordem das UFs
+pela variação também é pré-calculada, então "quem mais subiu" e a
+trajetória de uma UF são só leituras do índice, sem ordenar nada na hora.
+"""
+import numpy as np
+import pandas as pd
+
+from .medicao import medido
+
+
+class Posicoes:
+    """Posições, percentis e variações de posição (ano × UF × métrica)."""
+
+    @medido('posicoes.montar')
+    def __init__(self, cubo):
+        self.versao = cubo.versao
+        self.colunas = list(cubo.colunas)
+        self.anos = sorted(cubo.anos)
+        self.ufs = list(cubo.ufs)
+        self._pos_ano = {ano: i for i, ano in enumerate(self.anos)}
+        self._pos_uf = {uf: i for i, uf in enumerate(self.ufs)}
+        self._pos_col = {col: i for i, col in enumerate(self.colunas)}
+
+        self.valores = np.stack([
+            cubo.ano(ano).reindex(self.ufs)[self.colunas].to_numpy(dtype=float)
+            for ano in self.anos
+        ])
+        posicao = np.full(self.valores.shape, np.nan)
+        percentil = np.full(self.valores.shape, np.nan)
+        for i in range(len(self.anos)):
+            recorte = pd.DataFrame(self.valores[i])
+            posicao[i] = recorte.rank(method='dense', ascending=False).to_numpy()
+            # Fração das UFs com valor menor ou igual (100 = maior valor do ano)
+            percentil[i] = recorte.rank(method='max', pct=True).to_numpy() * 100
+        self.posicao = posicao
+        self.percentil = percentil
+
+        # Variação em relação ao ano anterior disponível (positiva = subiu)
+        self.variacao = np.full(self.valores.shape, np.nan)
+        self.variacao[1:] = posicao[:-1] - posicao[1:]
+
+        # UFs de cada (ano, métrica) da maior subida para a maior queda; as
+        # sem variação definida ficam no fim e são contadas em _validas
+        chave = np.where(np.isnan(self.variacao), np.inf, -self.variacao)
+        self._ordem_variacao = np.argsort(chave, axis=1, kind='stable')
+        self._validas = (~np.isnan(self.variacao)).sum(axis=1)
+
+    def ano_anterior(self, ano):
+        i = self._pos_ano[ano]
+        return self.anos[i - 1] if i > 0 else None
+
+    def posicao_de(self, ano, uf, col):
+        return self.posicao[self._pos_ano[ano], self._pos_uf[uf], self._pos_col[col]]
+
+    def maiores_variacoes(self, ano, col, n=5):
+        """(subiram, caíram): as ``n`` UFs que mais ganharam e mais perderam posições."""
+        a, c = self._pos_ano[ano], self._pos_col[col]
+        validas = self._ordem_variacao[a, :self._validas[a, c], c]
+        subiram = [i for i in validas[:n] if self.variacao[a, i, c] > 0]
+        cairam = [i for i in validas[::-1][:n] if self.variacao[a, i, c] < 0]
+        return self._quadro(a, c, subiram), self._quadro(a, c, cairam)
+
+    def _quadro(self, a, c, indices):
+        indices = np.asarray(indices, dtype=int)
+        return pd.DataFrame({
+            'UF': [self.ufs[i] for i in indices],
+            'Posição anterior': self.posicao[a - 1, indices, c],
+            'Posição': self.posicao[a, indices, c],
+            'Variação': self.variacao[a, indices, c],
+        }).astype({'Posição anterior': 'Int64', 'Posição': 'Int64', 'Variação': 'Int64'})
+
+    def trajetoria(self, uf, col):
+        """Posição, percentil e valor da UF na métrica, ano a ano (índice Ano)."""
+        u, c = self._pos_uf[uf], self._pos_col[col]
+        return pd.DataFrame({
+            'Posição': self.posicao[:, u, c],
+            'Percentil': self.percentil[:, u, c],
+            'Valor': self.valores[:, u, c],
+            'Variação': self.variacao[:, u, c],
+        }, index=pd.Index(self.anos, name='Ano'))
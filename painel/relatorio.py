@@ -0,0 +1,252 @@
+"""Relatórios estáticos de todas as combinações de ano, métrica e UF.
+
+Gera sem navegador e sem rede as mesmas figuras do painel (funções de
+``painel.graficos``): mapa e ranking por ano × métrica, comparativo
+bivariado por ano × par sugerido e evolução por UF × métrica. Cada figura
+é gravada em JSON (a especificação Plotly/Vega-Lite), HTML e, quando o
+kaleido (Plotly) e o vl-convert (Altair) estão instalados, PNG.
+
+As combinações são distribuídas num pool de processos e os arquivos são
+gravados à medida que ficam prontos. O ``manifesto.json`` da pasta de
+saída guarda o hash da especificação de cada figura; figuras que não
+mudaram desde a última execução não são regravadas.
+
+O mapa usa o estilo sem tiles (``graficos.ESTILO_MAPA_OFFLINE``). O HTML
+do Plotly aponta para uma cópia local do plotly.js; o do Altair leva o
+Vega embutido, tirado do vl-convert, e por isso só é gerado com ele
+instalado (sem ele, as figuras do Altair saem em JSON e sem HTML).
+
+    python -m painel.relatorio [--saida relatorios] [--formatos json html png] [--processos N]
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import dados, figuras, geo, graficos
+from .agregados import Cubo
+from .correlacao import RegistroPares
+from .metricas import NOMES
+
+SECOES = ('mapa', 'ranking', 'bivariado', 'evolucao')
+FORMATOS = ('json', 'html', 'png')
+
+# Entra no hash de cada figura guardado no manifesto.json da saída, então trocar
+# o número regrava todos os artefatos (2: HTML do Altair com o Vega embutido)
+VERSAO_RELATORIO = 2
+
+_contexto = {}
+
+
+def _slug(texto):
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^0-9a-zA-Z]+', '_', texto).strip('_').lower()
+
+
+def tarefas(cubo, secoes=SECOES, com_mapa=True):
+    """Combinações a gerar, como tuplas (seção, chave, métrica ou par)."""
+    lista = []
+    sugeridos = list(RegistroPares(cubo).sugeridos)
+    for ano in sorted(cubo.anos):
+        for col in cubo.colunas:
+            if 'mapa' in secoes and com_mapa:
+                lista.append(('mapa', ano, col))
+            if 'ranking' in secoes:
+                lista.append(('ranking', ano, col))
+        if 'bivariado' in secoes:
+            lista += [('bivariado', ano, nome) for nome in sugeridos]
+    if 'evolucao' in secoes:
+        for uf in ["Brasil"] + cubo.ufs:
+            lista += [('evolucao', uf, col) for col in cubo.colunas]
+    return lista
+
+
+def _figuras(tarefa):
+    """(caminho relativo sem extensão, figura) de cada figura da tarefa."""
+    cubo = _contexto['cubo']
+    secao, chave, item = tarefa
+    base = f"{secao}/{_slug(chave)}"
+    if secao == 'mapa':
+        df_mapa = graficos.dados_mapa(cubo, chave, item).dropna(subset=['UF_Sigla'])
+        if df_mapa.empty:
+            return []
+        return [(f"{base}/{item}", graficos.mapa(df_mapa, _contexto['geojson'], item, NOMES[item], chave,
+                                                  estilo=graficos.ESTILO_MAPA_OFFLINE))]
+    if secao == 'ranking':
+        serie = cubo.ranking(chave, item)
+        if serie.empty:
+            return []
+        return [(f"{base}/{item}_maiores", graficos.ranking(serie, item, NOMES[item])),
+                (f"{base}/{item}_menores", graficos.ranking(serie, item, NOMES[item], maiores=False))]
+    if secao == 'bivariado':
+        pares = RegistroPares(cubo)
+        col_a, col_b = pares.sugeridos[item]
+        df_par = pares.par(chave, col_a, col_b)
+        if df_par.empty:
+            return []
+        return [(f"{base}/{_slug(item)}", graficos.bivariado(df_par, col_a, col_b, chave))]
+    serie = cubo.nacional if chave == "Brasil" else cubo.uf(chave)
+    return [(f"{base}/{item}", graficos.evolucao(serie, [item], f"Evolução de {NOMES[item]}: {chave}"))]
+
+
+def _hash(spec):
+    # O Altair numera parâmetros e views com um contador global (param_12,
+    # view_3), que muda conforme a ordem em que cada processo montou as
+    # figuras; a numeração é refeita pela ordem de aparição antes do hash
+    nomes = {}
+    normalizado = re.sub(r'\b(param|view)_\d+\b',
+                         lambda m: nomes.setdefault(m.group(0), f"{m.group(1)}_{len(nomes)}"), spec)
+    return hashlib.sha256(f"{VERSAO_RELATORIO}:{normalizado}".encode()).hexdigest()
+
+
+def _exportador_instalado(tipo):
+    # kaleido exporta figuras do Plotly; vl-convert, especificações Vega-Lite
+    modulo = 'kaleido' if tipo == figuras.PLOTLY else 'vl_convert'
+    return importlib.util.find_spec(modulo) is not None
+
+
+def _gravar(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    modo = 'wb' if isinstance(conteudo, bytes) else 'w'
+
+    def escrever(tmp):
+        with open(tmp, modo, **({} if modo == 'wb' else {'encoding': 'utf-8'})) as f:
+            f.write(conteudo)
+
+    dados._gravar_atomico(caminho, escrever)
+
+
+def _artefatos(relativo, figura, tipo, spec):
+    """Conteúdo de cada formato pedido, por extensão (PNG só com o exportador instalado)."""
+    saida = _contexto['saida']
+    for formato in _contexto['formatos']:
+        if formato == 'json':
+            yield 'json', lambda: spec
+        elif formato == 'html' and tipo == figuras.PLOTLY:
+            # plotly.js local (gravado uma vez na raiz da saída), para abrir sem rede
+            raiz = os.path.relpath(saida, os.path.dirname(os.path.join(saida, relativo)))
+            yield 'html', lambda: figura.to_html(include_plotlyjs=f"{raiz}/plotly.min.js".replace(os.sep, '/'))
+        elif formato == 'html' and _exportador_instalado(tipo):
+            # Vega, Vega-Lite e vega-embed embutidos (do vl-convert), para abrir sem rede
+            yield 'html', lambda: figura.to_html(inline=True)
+        elif formato == 'png' and _exportador_instalado(tipo):
+            if tipo == figuras.PLOTLY:
+                yield 'png', lambda: figura.to_image(format='png')
+            else:
+                yield 'png', lambda: _png_vega_lite(spec)
+
+
+def _png_vega_lite(spec):
+    import vl_convert
+    return vl_convert.vegalite_to_png(spec)
+
+
+def _iniciar(cubo, geojson, saida, formatos, hashes):
+    _contexto.update(cubo=cubo, geojson=geojson, saida=saida, formatos=formatos, hashes=hashes)
+
+
+def gerar(tarefa):
+    """Grava os artefatos da tarefa; devolve [(relativo, hash, gravou)]."""
+    saida = _contexto['saida']
+    resultados = []
+    for relativo, figura in _figuras(tarefa):
+        tipo, spec = figuras.serializar(figura)
+        digest = _hash(spec)
+        pendentes = [
+            (extensao, conteudo) for extensao, conteudo in _artefatos(relativo, figura, tipo, spec)
+            if _contexto['hashes'].get(relativo) != digest
+            or not os.path.exists(os.path.join(saida, f"{relativo}.{extensao}"))
+        ]
+        for extensao, conteudo in pendentes:
+            _gravar(os.path.join(saida, f"{relativo}.{extensao}"), conteudo())
+        resultados.append((relativo, digest, bool(pendentes)))
+    return resultados
+
+
+def _gravar_manifesto(saida, hashes):
+    _gravar(os.path.join(saida, 'manifesto.json'), json.dumps(hashes, indent=1, sort_keys=True))
+
+
+def _ler_manifesto(saida):
+    try:
+        with open(os.path.join(saida, 'manifesto.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def renderizar(saida='relatorios', formatos=('json', 'html'), secoes=SECOES, processos=None,
+               caminho_csv=dados.CAMINHO_CSV, caminho_geojson='brasil_estados.json'):
+    """Gera os relatórios em ``saida``. Retorna (figuras gravadas, figuras inalteradas)."""
+    cubo = Cubo(dados.carregar(caminho_csv))
+    geojson = None
+    if 'mapa' in secoes:
+        if os.path.exists(caminho_geojson):
+            geojson = geo.carregar(caminho_geojson).nivel(geo.NIVEL_MAPA)
+        else:
+            print(f"Aviso: '{caminho_geojson}' não encontrado; os mapas não serão gerados.", file=sys.stderr)
+    if 'png' in formatos:
+        for tipo, pacote in ((figuras.PLOTLY, 'kaleido'), (figuras.VEGA_LITE, 'vl-convert-python')):
+            if not _exportador_instalado(tipo):
+                print(f"Aviso: {pacote} não está instalado; PNG das figuras {tipo} não será gerado.", file=sys.stderr)
+    if 'html' in formatos and not _exportador_instalado(figuras.VEGA_LITE):
+        print("Aviso: vl-convert-python não está instalado; HTML das figuras vega_lite "
+              "(que embute o Vega a partir dele) não será gerado.", file=sys.stderr)
+
+    os.makedirs(saida, exist_ok=True)
+    if 'html' in formatos and not os.path.exists(os.path.join(saida, 'plotly.min.js')):
+        from plotly.offline import get_plotlyjs
+        _gravar(os.path.join(saida, 'plotly.min.js'), get_plotlyjs())
+
+    hashes = _ler_manifesto(saida)
+    lista = tarefas(cubo, secoes, com_mapa=geojson is not None)
+    contexto = (cubo, geojson, saida, tuple(formatos), dict(hashes))
+    gravadas = inalteradas = 0
+
+    def registrar(resultados):
+        nonlocal gravadas, inalteradas
+        for relativo, digest, gravou in resultados:
+            hashes[relativo] = digest
+            gravadas += gravou
+            inalteradas += not gravou
+
+    if processos == 1:
+        _iniciar(*contexto)
+        for tarefa in lista:
+            registrar(gerar(tarefa))
+    else:
+        with ProcessPoolExecutor(processos, initializer=_iniciar, initargs=contexto) as pool:
+            futuros = [pool.submit(gerar, tarefa) for tarefa in lista]
+            for i, futuro in enumerate(as_completed(futuros), 1):
+                registrar(futuro.result())
+                # O manifesto acompanha o progresso: uma execução interrompida
+                # não regrava o que já ficou pronto
+                if i % 50 == 0:
+                    _gravar_manifesto(saida, hashes)
+    _gravar_manifesto(saida, hashes)
+    return gravadas, inalteradas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--saida', default='relatorios')
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=['json', 'html'])
+    parser.add_argument('--secoes', nargs='+', choices=SECOES, default=list(SECOES))
+    parser.add_argument('--processos', type=int, default=None, help="padrão: número de CPUs")
+    parser.add_argument('--csv', default=dados.CAMINHO_CSV)
+    parser.add_argument('--geojson', default='brasil_estados.json')
+    args = parser.parse_args(argv)
+
+    gravadas, inalteradas = renderizar(args.saida, args.formatos, args.secoes, args.processos,
+                                       args.csv, args.geojson)
+    print(f"{gravadas} figuras gravadas, {inalteradas} inalteradas em {args.saida}/")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Derivadas das séries temporais de cada UF (e do Brasil) por métrica.
+
+Variação anual, CAGR, média móvel e índice com base 100 são calculados
+de uma vez para todas as UFs e métricas, como operações sobre um tensor
+(UF × ano × métrica), e guardados por versão do cubo. A seção de
+evolução só lê as séries prontas.
+
+Os anos são tomados na ordem em que existem no cubo: a variação anual e
+a média móvel comparam cada ano com os anos anteriores disponíveis, e o
+CAGR usa a diferença real entre os anos.
+"""
+import numpy as np
+import pandas as pd
+
+from .medicao import medido
+
+VALOR = 'valor'
+VARIACAO = 'variacao'
+CAGR = 'cagr'
+MEDIA_MOVEL = 'media_movel'
+INDICE = 'indice'
+
+# Janela da média móvel, em anos, e mínimo de anos com valor dentro dela
+JANELA_MEDIA = 3
+MINIMO_MEDIA = 2
+
+TRANSFORMACOES = {
+    VALOR: "Valor",
+    VARIACAO: "Variação anual (%)",
+    CAGR: "CAGR desde o primeiro ano (%)",
+    MEDIA_MOVEL: f"Média móvel ({JANELA_MEDIA} anos)",
+    INDICE: "Índice (primeiro ano = 100)",
+}
+
+
+def _media_movel(valores, janela, minimo):
+    """Média ao longo do eixo 1 nas últimas ``janela`` posições, ignorando NaN."""
+    validos = ~np.isnan(valores)
+    soma = np.cumsum(np.where(validos, valores, 0.0), axis=1)
+    contagem = np.cumsum(validos, axis=1)
+    soma[:, janela:] = soma[:, janela:] - soma[:, :-janela]
+    contagem[:, janela:] = contagem[:, janela:] - contagem[:, :-janela]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = soma / contagem
+    media[contagem < minimo] = np.nan
+    return media
+
+
+class SeriesTemporais:
+    """Séries derivadas (UF × ano × métrica), com "Brasil" como uma UF a mais."""
+
+    @medido('series.montar')
+    def __init__(self, cubo):
+        self.versao = cubo.versao
+        self.colunas = list(cubo.colunas)
+        self.anos = sorted(cubo.anos)
+        self.ufs = ["Brasil"] + list(cubo.ufs)
+        self._pos_uf = {uf: i for i, uf in enumerate(self.ufs)}
+
+        nacional = cubo.nacional.reindex(self.anos)[self.colunas].to_numpy(dtype=float)
+        por_ano = np.stack([
+            cubo.ano(ano).reindex(cubo.ufs)[self.colunas].to_numpy(dtype=float)
+            for ano in self.anos
+        ], axis=1)
+        valores = np.concatenate([nacional[None], por_ano])
+        anos = np.asarray(self.anos, dtype=float)[None, :, None]
+
+        # Primeiro ano com valor de cada (UF, métrica): base do índice e do CAGR
+        validos = ~np.isnan(valores)
+        primeiro = np.where(validos.any(axis=1), validos.argmax(axis=1), 0)
+        base = np.take_along_axis(valores, primeiro[:, None, :], axis=1)
+        ano_base = np.asarray(self.anos, dtype=float)[primeiro][:, None, :]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variacao = np.full_like(valores, np.nan)
+            variacao[:, 1:] = (valores[:, 1:] / valores[:, :-1] - 1) * 100
+            indice = valores / base * 100
+            periodos = anos - ano_base
+            cagr = (np.power(valores / base, 1 / periodos) - 1) * 100
+        # Razões com zero ou sinais trocados não têm variação nem crescimento definidos
+        for serie in (variacao, indice, cagr):
+            serie[~np.isfinite(serie)] = np.nan
+        base_invalida = np.broadcast_to(base <= 0, valores.shape)
+        cagr[(periodos <= 0) | (valores < 0) | base_invalida] = np.nan
+        indice[base_invalida] = np.nan
+
+        self._series = {
+            VALOR: valores,
+            VARIACAO: variacao,
+            CAGR: cagr,
+            MEDIA_MOVEL: _media_movel(valores, JANELA_MEDIA, MINIMO_MEDIA),
+            INDICE: indice,
+        }
+
+    def serie(self, uf, colunas=None, transformacao=VALOR):
+        """Série da UF (ou "Brasil") nas colunas pedidas, indexada por Ano."""
+        colunas = self.colunas if colunas is None else list(colunas)
+        indices = [self.colunas.index(col) for col in colunas]
+        return pd.DataFrame(
+            self._series[transformacao][self._pos_uf[uf]][:, indices],
+            index=pd.Index(self.anos, name='Ano'), columns=colunas,
+        )
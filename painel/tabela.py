@@ -0,0 +1,112 @@
+"""Tabela de dados paginada, com ordenação e filtros feitos no servidor.
+
+As ordens de todas as colunas são calculadas uma vez por versão dos dados
+(``argsort`` estável, com ausentes sempre no fim). Filtrar é montar uma
+máscara booleana; ordenar é percorrer a ordem pronta e ficar com as
+linhas da máscara. Só a página visível vira DataFrame para o navegador.
+
+A exportação (CSV ou Parquet) é escrita em blocos de linhas, sem montar
+o recorte filtrado inteiro como DataFrame; só os bytes do arquivo ficam
+em memória, porque o ``st.download_button`` recebe o conteúdo pronto.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from .medicao import medido
+
+BLOCO_EXPORTACAO = 50000
+
+
+def _numeros(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype) or not pd.api.types.is_numeric_dtype(serie):
+        return None
+    return serie.to_numpy(dtype=float, na_value=np.nan)
+
+
+class Tabela:
+    """Quadro com ordens pré-calculadas por coluna para paginação no servidor."""
+
+    @medido('tabela.montar')
+    def __init__(self, df, colunas=None):
+        colunas = list(df.columns) if colunas is None else [col for col in colunas if col in df.columns]
+        self.df = df[colunas].reset_index(drop=True)
+        self.colunas = colunas
+        self.versao = df.attrs.get('versao')
+        self._ufs = self.df['UF'].astype(str).to_numpy()
+        self._anos = self.df['Ano'].to_numpy()
+        self.ufs = sorted(set(self._ufs))
+        self.anos = (int(self._anos.min()), int(self._anos.max())) if len(self._anos) else (0, 0)
+
+        self._numeros = {}
+        self._ordens = {}
+        for col in colunas:
+            numeros = _numeros(self.df[col])
+            if numeros is None:
+                chave = self.df[col].astype(str).to_numpy()
+                self._ordens[col] = (np.argsort(chave, kind='stable'), len(chave))
+                continue
+            self._numeros[col] = numeros
+            ausentes = np.isnan(numeros)
+            ordem = np.argsort(np.where(ausentes, np.inf, numeros), kind='stable')
+            # Ordem crescente e quantas posições válidas vêm antes dos ausentes
+            self._ordens[col] = (ordem, int((~ausentes).sum()))
+        # Ordem padrão da tabela: UF e, dentro dela, Ano
+        self._ordem_padrao = np.lexsort((self._anos, self._ufs))
+
+    def faixa(self, col):
+        """(mínimo, máximo) dos valores válidos da coluna numérica."""
+        numeros = self._numeros[col]
+        validos = numeros[~np.isnan(numeros)]
+        return (float(validos.min()), float(validos.max())) if len(validos) else (0.0, 0.0)
+
+    def filtrar(self, ufs=None, anos=None, limites=None):
+        """Máscara das linhas nas UFs, no intervalo de anos e nos limites ``{coluna: (mín, máx)}``."""
+        mascara = np.ones(len(self.df), dtype=bool)
+        if ufs:
+            mascara &= np.isin(self._ufs, list(ufs))
+        if anos is not None:
+            mascara &= (self._anos >= anos[0]) & (self._anos <= anos[1])
+        for col, (minimo, maximo) in (limites or {}).items():
+            numeros = self._numeros[col]
+            with np.errstate(invalid='ignore'):
+                mascara &= (numeros >= minimo) & (numeros <= maximo)
+        return mascara
+
+    def linhas(self, mascara, ordenar_por=None, crescente=True):
+        """Posições das linhas da máscara na ordem pedida (ausentes sempre no fim)."""
+        if ordenar_por is None:
+            ordem = self._ordem_padrao if crescente else self._ordem_padrao[::-1]
+        else:
+            ordem, validas = self._ordens[ordenar_por]
+            if not crescente:
+                ordem = np.concatenate([ordem[:validas][::-1], ordem[validas:]])
+        return ordem[mascara[ordem]]
+
+    def pagina(self, linhas, numero, tamanho):
+        """Página ``numero`` (a partir de 1) das linhas já filtradas e ordenadas."""
+        inicio = (numero - 1) * tamanho
+        return self.df.iloc[linhas[inicio:inicio + tamanho]]
+
+    def exportar(self, linhas, formato='csv', bloco=BLOCO_EXPORTACAO):
+        """Bytes do arquivo com as linhas, escritas em blocos de ``bloco`` linhas."""
+        arquivo = io.BytesIO()
+        blocos = (self.df.iloc[linhas[i:i + bloco]] for i in range(0, len(linhas), bloco))
+        if formato == 'csv':
+            texto = io.TextIOWrapper(arquivo, encoding='utf-8', newline='', write_through=True)
+            self.df.iloc[:0].to_csv(texto, index=False)
+            for parte in blocos:
+                parte.to_csv(texto, index=False, header=False)
+            texto.detach()
+        elif formato == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            esquema = pa.Schema.from_pandas(self.df, preserve_index=False)
+            with pq.ParquetWriter(arquivo, esquema) as escritor:
+                for parte in blocos:
+                    escritor.write_table(pa.Table.from_pandas(parte, schema=esquema, preserve_index=False))
+        else:
+            raise ValueError(f"Formato de exportação desconhecido: {formato}")
+        return arquivo.getvalue()
@@ -0,0 +1,51 @@
+"""Sobe o painel com os caches aquecidos e o endpoint de prontidão.
+
+Inicia o aquecimento (painel/aquecimento.py) e o endpoint de prontidão
+antes do Streamlit, no mesmo processo, para que o primeiro usuário já
+encontre os dados, os agregados e as figuras da visão padrão prontos. O
+balanceador de carga deve rotear para a instância só quando
+``/pronto`` responder 200.
+
+    python servidor.py [--porta-prontidao N] [--host-prontidao H] [argumentos do streamlit run]
+
+Por exemplo: ``python servidor.py --server.port 8501 --server.headless true``.
+Sem ``--porta-prontidao``, o endpoint fica na porta do Streamlit + 1000
+(9501 no exemplo), em 127.0.0.1.
+"""
+import argparse
+import os
+import sys
+
+from painel import aquecimento
+
+
+def porta_streamlit(argumentos):
+    """Porta em que o Streamlit vai escutar (``--server.port``, ambiente ou 8501)."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--server.port', dest='porta', type=int,
+                        default=int(os.environ.get('STREAMLIT_SERVER_PORT', 8501)))
+    return parser.parse_known_args(argumentos)[0].porta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--porta-prontidao', type=int,
+                        help="padrão: porta do Streamlit + %d" % aquecimento.DESLOCAMENTO_PRONTIDAO)
+    parser.add_argument('--host-prontidao', default='127.0.0.1')
+    args, argumentos_streamlit = parser.parse_known_args(argv)
+
+    porta_prontidao = args.porta_prontidao
+    if porta_prontidao is None:
+        porta_prontidao = porta_streamlit(argumentos_streamlit) + aquecimento.DESLOCAMENTO_PRONTIDAO
+
+    aquecimento.iniciar()
+    aquecimento.servir_prontidao(args.host_prontidao, porta_prontidao)
+
+    from streamlit.web import cli
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    sys.argv = ['streamlit', 'run', app, *argumentos_streamlit]
+    return cli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())